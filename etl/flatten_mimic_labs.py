@@ -1,15 +1,52 @@
+import argparse
+import shutil
+import time
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
 from pathlib import Path
+from interim import OBS_SCHEMA, to_obs_table
 
 PROJ = Path(__file__).resolve().parents[1]
 DATA = PROJ / "data"
 
 # Use MIMIC-IV demo hospital labs (the ED demo doesn't include labs)
 SRC  = DATA / "physionet.org/files/mimic-iv-demo/2.2/hosp/labevents.csv.gz"
-OUT  = DATA / "interim/labs.csv"
+OUT  = DATA / "interim/labs"   # partitioned Parquet dataset (hive layout: bucket=3/ or month=2148-08/)
 NROWS = None  # e.g. 100_000 for a quick run
+CHUNK_ROWS = 1_000_000  # rows per read; bounds peak memory
+BUCKETS = 16
+PARQUET_OPTS = ds.ParquetFileFormat().make_write_options(compression="zstd")
+
+# explicit dtypes: no type inference pass, compact ints, raw text only where we parse it
+DTYPES = {"subject_id": "int64", "hadm_id": "float64", "itemid": "int32",
+          "charttime": "string", "valuenum": "float64", "valueuom": "category"}
+
+def flatten_chunk(df):
+    """rename/coerce/dropna for one chunk; same rules as the old whole-file pass."""
+    df = df.rename(columns={"subject_id":"patient_id", "charttime":"timestamp",
+                            "valuenum":"value", "valueuom":"unit", "itemid":"code"})
+
+    df["timestamp"] = pd.to_datetime(df["timestamp"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    df = df.dropna(subset=["timestamp"])
+    df["value"] = pd.to_numeric(df["value"], errors="coerce")
+
+    return df[["patient_id","timestamp","code","value","unit"]].dropna(subset=["value"])
+
+def partition_key(out, partition_by, buckets):
+    if partition_by == "month":
+        return out["timestamp"].dt.strftime("%Y-%m").rename("month")
+    return (out["patient_id"] % buckets).astype("int32").rename("bucket")
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="labevents.csv.gz -> partitioned Parquet, in bounded-memory chunks")
+    p.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    p.add_argument("--partition-by", choices=["bucket", "month"], default="bucket",
+                   help="bucket = patient_id %% --buckets (per-patient reads), month = charttime month")
+    p.add_argument("--buckets", type=int, default=BUCKETS)
+    p.add_argument("--nrows", type=int, default=NROWS)
+    args = p.parse_args(argv)
 
-def main():
     if not SRC.exists():
         raise FileNotFoundError(
             f"Expected file not found: {SRC}\n"
@@ -17,20 +54,32 @@ def main():
         )
 
     usecols = [c for c in ["subject_id","hadm_id","charttime","itemid","valuenum","valueuom"]]
-    df = pd.read_csv(SRC, nrows=NROWS, usecols=lambda c: c in usecols)
+    reader = pd.read_csv(SRC, nrows=args.nrows, usecols=lambda c: c in usecols, dtype=DTYPES,
+                         chunksize=args.chunk_rows)
 
-    df = df.rename(columns={"subject_id":"patient_id", "charttime":"timestamp",
-                            "valuenum":"value", "valueuom":"unit", "itemid":"code"})
-
-    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
-    df = df.dropna(subset=["timestamp"])
-    df["value"] = pd.to_numeric(df["value"], errors="coerce")
+    # a re-run replaces the dataset instead of mixing in stale part files
+    if OUT.exists():
+        shutil.rmtree(OUT)
+    OUT.mkdir(parents=True)
 
-    out = df[["patient_id","timestamp","code","value","unit"]].dropna(subset=["value"])
+    key = "month" if args.partition_by == "month" else "bucket"
+    # interim observation schema (code = itemid as a dictionary string) + the partition column
+    schema = OBS_SCHEMA.append(pa.field(key, pa.string() if key == "month" else pa.int32()))
+    t0, read, wrote = time.perf_counter(), 0, 0
+    for i, chunk in enumerate(reader):
+        read += len(chunk)
+        out = flatten_chunk(chunk)
+        out[key] = partition_key(out, args.partition_by, args.buckets)
+        ds.write_dataset(to_obs_table(out, schema), OUT, format="parquet",
+                         partitioning=[key], partitioning_flavor="hive",
+                         basename_template=f"part-{i:05d}-{{i}}.parquet", file_options=PARQUET_OPTS,
+                         existing_data_behavior="overwrite_or_ignore")
+        wrote += len(out)
+        secs = time.perf_counter() - t0
+        print(f"  chunk {i}: {read:,} rows read, {wrote:,} written ({read / secs:,.0f} rows/s)")
 
-    OUT.parent.mkdir(parents=True, exist_ok=True)
-    out.to_csv(OUT, index=False)
-    print(f"Wrote {len(out):,} rows to {OUT}")
+    secs = time.perf_counter() - t0
+    print(f"Wrote {wrote:,} rows to {OUT} ({read:,} read in {secs:.1f}s, {read / secs if secs else 0:,.0f} rows/s)")
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,13 @@
+import numpy as np
 import pandas as pd
 import pathlib
+import time
+from interim import OBS_PATH, ObservationWriter
 
 SRC = r"data/physionet.org/files/mimic-iv-ed-demo/2.2/ed/vitalsign.csv.gz"
-OUT = "data/interim/observations.csv"
+OUT = OBS_PATH
 NROWS = None      # set to 50000 for a quick sample if you want
+CHUNK_ROWS = 500_000  # wide source rows per chunk; bounds peak memory
 
 # Map vitals -> (code, unit)
 VITAL_MAP = {
@@ -16,54 +20,63 @@ VITAL_MAP = {
     "glucose": ("GLUCOSE", "mg/dL"),
 }
 
-def main():
-    # Load a slice (pandas handles .gz automatically)
-    df = pd.read_csv(SRC, nrows=NROWS)
-
-    # Pick columns that actually exist in this file
-    available = [c for c in VITAL_MAP.keys() if c in df.columns]
-    if not available:
-        raise ValueError(f"No expected vital columns found in {SRC}. Got: {list(df.columns)}")
+def stack_vitals(df, available, patient_col):
+    """
+    Wide chunk -> long observations without melt: for each vital column take its non-null
+    values and pair them with constant code/unit category ids (no per-row Python).
+    """
+    ts = pd.to_datetime(df["charttime"], format="%Y-%m-%d %H:%M:%S", errors="coerce").to_numpy()
+    pid = df[patient_col].to_numpy()
+    ok_ts = ~np.isnat(ts)
 
-    # Basic id/time columns used in the ED demo
-    # (present in MIMIC-IV-ED vitals file)
-    id_cols = [c for c in ["subject_id", "stay_id", "charttime"] if c in df.columns]
+    codes = pd.unique(np.array([VITAL_MAP[v][0] for v in available], dtype=object))
+    units = pd.unique(np.array([VITAL_MAP[v][1] for v in available], dtype=object))
+    parts = {"patient_id": [], "timestamp": [], "value": [], "code": [], "unit": []}
+    for v in available:
+        vals = pd.to_numeric(df[v], errors="coerce").to_numpy(dtype="float32", na_value=np.nan)
+        keep = ok_ts & ~np.isnan(vals)
+        n = int(keep.sum())
+        parts["patient_id"].append(pid[keep])
+        parts["timestamp"].append(ts[keep])
+        parts["value"].append(vals[keep])
+        parts["code"].append(np.full(n, np.flatnonzero(codes == VITAL_MAP[v][0])[0], dtype="int32"))
+        parts["unit"].append(np.full(n, np.flatnonzero(units == VITAL_MAP[v][1])[0], dtype="int32"))
 
-    # Melt wide -> long for the available vitals
-    long = df[id_cols + available].melt(
-        id_vars=id_cols,
-        value_vars=available,
-        var_name="vital_name",
-        value_name="value"
-    )
+    return pd.DataFrame({
+        "patient_id": np.concatenate(parts["patient_id"]).astype("int64"),
+        "timestamp": np.concatenate(parts["timestamp"]),
+        "code": pd.Categorical.from_codes(np.concatenate(parts["code"]), categories=codes),
+        "value": np.concatenate(parts["value"]),
+        "unit": pd.Categorical.from_codes(np.concatenate(parts["unit"]), categories=units),
+    })
 
-    # Drop missing values
-    long = long.dropna(subset=["value"])
-
-    # Map to our standard schema
-    long["code"] = long["vital_name"].map(lambda v: VITAL_MAP[v][0])
-    long["unit"] = long["vital_name"].map(lambda v: VITAL_MAP[v][1])
+def main():
+    header = pd.read_csv(SRC, nrows=0).columns
 
-    # Rename and select final columns
-    long = long.rename(columns={"subject_id": "patient_id", "charttime": "timestamp"})
-    for col in ["patient_id", "timestamp"]:
-        if col not in long.columns:
-            # Fall back to stay_id as patient id if subject_id missing
-            if col == "patient_id" and "stay_id" in long.columns:
-                long["patient_id"] = long["stay_id"]
-            else:
-                raise ValueError(f"Required column {col} not found in source.")
+    # Pick columns that actually exist in this file
+    available = [c for c in VITAL_MAP.keys() if c in header]
+    if not available:
+        raise ValueError(f"No expected vital columns found in {SRC}. Got: {list(header)}")
 
-    long["timestamp"] = pd.to_datetime(long["timestamp"], errors="coerce")
-    long = long.dropna(subset=["timestamp"])
-    long["value"] = pd.to_numeric(long["value"], errors="coerce")
+    # Basic id/time columns used in the ED demo (present in MIMIC-IV-ED vitals file);
+    # fall back to stay_id as patient id if subject_id is missing
+    patient_col = "subject_id" if "subject_id" in header else "stay_id"
+    for col in [patient_col, "charttime"]:
+        if col not in header:
+            raise ValueError(f"Required column {col} not found in source.")
 
-    # keep only our standard five columns
-    obs = long[["patient_id", "timestamp", "code", "value", "unit"]]
+    usecols = [patient_col, "charttime"] + available
+    reader = pd.read_csv(SRC, nrows=NROWS, usecols=usecols, chunksize=CHUNK_ROWS,
+                         dtype={patient_col: "int64", "charttime": "string"})
 
     pathlib.Path("data/interim").mkdir(parents=True, exist_ok=True)
-    obs.to_csv(OUT, index=False)
-    print(f"Wrote {len(obs):,} rows to {OUT}")
+    t0, read = time.perf_counter(), 0
+    with ObservationWriter(OUT) as w:
+        for chunk in reader:
+            read += len(chunk)
+            w.write(stack_vitals(chunk, available, patient_col))
+    secs = time.perf_counter() - t0
+    print(f"Wrote {w.rows:,} rows to {OUT} ({read:,} source rows in {secs:.1f}s)")
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,17 @@
 import pandas as pd
 import pathlib
+from interim import OBS_PATH, write_observations
 
-# Minimal placeholder data
+# Minimal placeholder data (patient_id is an integer id, as in MIMIC)
 data = [
-    {"patient_id": "p1", "timestamp": "2025-09-18T10:00", "code": "HR", "value": 85, "unit": "bpm"},
-    {"patient_id": "p2", "timestamp": "2025-09-18T10:05", "code": "BP_SYS", "value": 120, "unit": "mmHg"},
+    {"patient_id": 1, "timestamp": "2025-09-18T10:00", "code": "HR", "value": 85, "unit": "bpm"},
+    {"patient_id": 2, "timestamp": "2025-09-18T10:05", "code": "BP_SYS", "value": 120, "unit": "mmHg"},
 ]
 
 df = pd.DataFrame(data)
+df["timestamp"] = pd.to_datetime(df["timestamp"])
+df["value"] = df["value"].astype("float64")
 
 pathlib.Path("data/interim").mkdir(parents=True, exist_ok=True)
-df.to_csv("data/interim/observations.csv", index=False)
-print("Created data/interim/observations.csv")
+write_observations(df, OBS_PATH)
+print(f"Created {OBS_PATH}")
@@ -0,0 +1,55 @@
+# etl/interim.py
+# Typed Parquet interim layer shared by the etl/ scripts (run from the repo root).
+# Downstream stages read it with pd.read_parquet(path, columns=[...]); the schema travels
+# in the file, so nothing re-parses timestamps or numbers from text.
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+OBS_PATH = "data/interim/observations.parquet"
+OBS_COLUMNS = ["patient_id", "timestamp", "code", "value", "unit"]
+
+# code/unit repeat a handful of values across millions of rows -> dictionary-encoded strings
+OBS_SCHEMA = pa.schema([
+    pa.field("patient_id", pa.int64(), nullable=False),
+    pa.field("timestamp", pa.timestamp("us"), nullable=False),
+    pa.field("code", pa.dictionary(pa.int32(), pa.string()), nullable=False),
+    pa.field("value", pa.float32()),  # measurement precision; stages aggregate in float64
+    pa.field("unit", pa.dictionary(pa.int32(), pa.string())),
+])
+
+def to_obs_table(df: pd.DataFrame, schema: pa.Schema = OBS_SCHEMA) -> pa.Table:
+    """Cast a patient_id/timestamp/code/value/unit frame to the declared schema (raises on mismatch)."""
+    df = df[[f.name for f in schema]].copy()
+    for col in ("code", "unit"):
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("string")
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+class ObservationWriter:
+    """Append chunks to one zstd Parquet file, one row group per write()."""
+
+    def __init__(self, path: str = OBS_PATH, schema: pa.Schema = OBS_SCHEMA):
+        self.path = path
+        self.schema = schema
+        self.rows = 0
+        self._writer = pq.ParquetWriter(path, schema, compression="zstd")
+
+    def write(self, df: pd.DataFrame):
+        if len(df):
+            self._writer.write_table(to_obs_table(df, self.schema))
+            self.rows += len(df)
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_observations(df: pd.DataFrame, path: str = OBS_PATH) -> int:
+    with ObservationWriter(path) as w:
+        w.write(df)
+    return w.rows
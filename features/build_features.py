@@ -1,44 +1,79 @@
-
 # features/build_features.py
+import numpy as np
 import pandas as pd
 import pathlib
 
-SRC = "data/interim/observations.csv"
+SRC = "data/interim/observations.parquet"  # typed interim layer (etl/interim.py), no text re-parsing
 OUT = "data/processed/features.parquet"   # small + fast to load
+STATS = ["mean", "std", "min", "max", "count", "last"]
 
-def main():
-    df = pd.read_csv(SRC)
-    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
-    df = df.dropna(subset=["timestamp"])
-    df["value"] = pd.to_numeric(df["value"], errors="coerce")
-
+def compute_features(df):
+    """
+    One row per patient, columns like HR_mean, HR_last, … (same names/order as the old
+    groupby + melt + pivot), computed in one sorted pass:
+      - one argsort on an int64 (patient, code) key makes every group a contiguous slice
+      - np.*.reduceat over the group starts gives sum/min/max/latest time in a single sweep each
+      - last = value at the group's latest timestamp (ties -> the row that came last in the file)
+      - results go straight into a float32 patients x features matrix
+    """
     # basic QC: keep rows with a value
-    df = df.dropna(subset=["value"])
-
-    # recent value per (patient, code)
-    df = df.sort_values(["patient_id", "code", "timestamp"])
-    last_val = df.groupby(["patient_id", "code"])["value"].last().rename("last")
-
-    # simple stats per (patient, code)
-    agg = df.groupby(["patient_id", "code"])["value"].agg(mean="mean", std="std", min="min", max="max", count="count")
-
-    # combine + pivot wide: one row per patient, columns like HR_mean, HR_last, …
-    wide = pd.concat([agg, last_val], axis=1).reset_index()
-    wide["feature_prefix"] = wide["code"].astype(str)
-    # build wide column names
-    wide_cols = {}
-    for stat in ["mean", "std", "min", "max", "count", "last"]:
-        wide_cols[stat] = wide["feature_prefix"] + f"_{stat}"
-    # construct a tidy table for pivot
-    tidy = pd.melt(
-        wide,
-        id_vars=["patient_id", "code", "feature_prefix"],
-        value_vars=["mean", "std", "min", "max", "count", "last"],
-        var_name="stat",
-        value_name="val",
-    )
-    tidy["feature"] = tidy["feature_prefix"] + "_" + tidy["stat"]
-    feat = tidy.pivot(index="patient_id", columns="feature", values="val").reset_index()
+    keep = df["value"].notna().to_numpy()
+    pid = df["patient_id"].to_numpy()[keep]
+    ts = df["timestamp"].to_numpy()[keep].view("int64")
+    value = df["value"].to_numpy(dtype="float64")[keep]  # interim values are float32, aggregate in float64
+    code = df["code"]
+    if isinstance(code.dtype, pd.CategoricalDtype):
+        cid, names = code.cat.codes.to_numpy()[keep], code.cat.categories.astype(str)
+    else:
+        cid, names = pd.factorize(code[keep].astype(str))
+    n = len(value)
+    if n == 0:
+        return pd.DataFrame(columns=["patient_id"])
+
+    # sorting one int64 key is several times cheaper than lexsort over (patient, code, timestamp)
+    key = (pid - pid.min()) * len(names) + cid
+    order = np.argsort(key)
+    key, v, ts = key[order], value[order], ts[order]
+
+    new_group = np.empty(n, dtype=bool)
+    new_group[0] = True
+    new_group[1:] = key[1:] != key[:-1]
+    starts = np.flatnonzero(new_group)
+    count = np.diff(np.append(starts, n))
+
+    mean = np.add.reduceat(v, starts) / count
+    dev = v - np.repeat(mean, count)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.sqrt(np.add.reduceat(dev * dev, starts) / (count - 1))  # ddof=1, NaN for single rows
+    latest = np.repeat(np.maximum.reduceat(ts, starts), count) == ts
+    last_row = np.maximum.reduceat(np.where(latest, order, -1), starts)
+    per_group = {
+        "mean": mean, "std": std,
+        "min": np.minimum.reduceat(v, starts), "max": np.maximum.reduceat(v, starts),
+        "count": count, "last": value[last_row],
+    }
+
+    # rows: patients in sorted order; columns: "<code>_<stat>" sorted by name, like pivot()
+    g_pid, g_cid = pid[order[starts]], cid[order[starts]]
+    new_patient = np.append(True, g_pid[1:] != g_pid[:-1])
+    row = np.cumsum(new_patient) - 1
+    used = np.unique(g_cid)
+    feats = sorted(f"{names[c]}_{s}" for c in used for s in STATS)
+    col_of = {f: j for j, f in enumerate(feats)}
+
+    mat = np.full((int(row[-1]) + 1, len(feats)), np.nan, dtype="float32")
+    for c in used:
+        in_c = g_cid == c
+        for s in STATS:
+            mat[row[in_c], col_of[f"{names[c]}_{s}"]] = per_group[s][in_c]
+
+    feat = pd.DataFrame(mat, columns=feats)
+    feat.insert(0, "patient_id", g_pid[new_patient])
+    return feat
+
+def main():
+    df = pd.read_parquet(SRC, columns=["patient_id", "timestamp", "code", "value"])
+    feat = compute_features(df)
 
     pathlib.Path("data/processed").mkdir(parents=True, exist_ok=True)
     feat.to_parquet(OUT, index=False)
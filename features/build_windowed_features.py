@@ -0,0 +1,112 @@
+# features/build_windowed_features.py
+import numpy as np
+import pandas as pd
+import pathlib
+
+OBS = "data/interim/observations.parquet"
+EDSTAYS = "data/physionet.org/files/mimic-iv-ed-demo/2.2/ed/edstays.csv.gz"
+OUT = "data/processed/windowed_features.parquet"
+WINDOWS = {"6h": pd.Timedelta(hours=6), "24h": pd.Timedelta(hours=24), "7d": pd.Timedelta(days=7)}
+STATS = ["mean", "std", "min", "max", "count", "last"]
+
+def load_cutoffs(path=EDSTAYS):
+    """One cutoff per ED stay: features are computed as of arrival (intime)."""
+    df = pd.read_csv(path, usecols=["subject_id", "stay_id", "intime"],
+                     dtype={"subject_id": "int64", "stay_id": "int64", "intime": "string"})
+    df["cutoff_time"] = pd.to_datetime(df["intime"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    df = df.dropna(subset=["cutoff_time"])
+    return df.rename(columns={"subject_id": "patient_id"})[["stay_id", "patient_id", "cutoff_time"]]
+
+def compute_windowed_features(obs, cutoffs, windows=WINDOWS):
+    """
+    Point-in-time features: for every (patient_id, cutoff_time) row and code, stats over the
+    observations in (cutoff - window, cutoff]; nothing after the cutoff is ever read.
+      - observations are sorted once on (code, int64 (patient, seconds) key)
+      - cutoffs are sorted the same way, so each window edge is one vectorized searchsorted and
+        the [lo, hi) row ranges sweep forward through the observations
+      - count/mean/std from prefix sums, min/max via reduceat over the ranges, last = row hi-1
+    Returns one row per cutoff, sorted by (patient, cutoff) with the cutoffs' index and extra columns
+    kept (re-ordering a wide float32 matrix costs more than the sweep), plus <code>_<stat>_<window>
+    columns; count is 0 and the rest NaN where the window holds no observation.
+    """
+    keep = obs["value"].notna().to_numpy()
+    o_pid = obs["patient_id"].to_numpy()[keep]
+    o_sec = obs["timestamp"].to_numpy()[keep].astype("datetime64[s]").view("int64")
+    o_val = obs["value"].to_numpy(dtype="float64")[keep]
+    code = obs["code"]
+    if isinstance(code.dtype, pd.CategoricalDtype):
+        cid, names = code.cat.codes.to_numpy()[keep], code.cat.categories.astype(str)
+    else:
+        cid, names = pd.factorize(code[keep].astype(str))
+
+    c_sec = cutoffs["cutoff_time"].to_numpy().astype("datetime64[s]").view("int64")
+    if len(o_val) == 0 or len(c_sec) == 0:
+        return cutoffs.copy()
+    # (patient, time) -> one sortable int64: dense patient id * span + seconds since the earliest time
+    p, _ = pd.factorize(np.concatenate([o_pid, cutoffs["patient_id"].to_numpy()]))
+    o_p, c_p = p[:len(o_pid)], p[len(o_pid):]
+    t0 = min(o_sec.min(), c_sec.min())
+    span = max(o_sec.max(), c_sec.max()) - t0 + 1
+    block = (int(p.max()) + 1) * span  # key range of one code
+    if block * len(names) >= 2 ** 62:
+        raise ValueError("code x patient x time range too large for an int64 sweep key")
+    o_key = o_p * span + (o_sec - t0)
+    # cutoffs in key order: window ranges advance monotonically, so the reduceat gaps between
+    # consecutive windows stay short instead of spanning the whole table
+    c_order = np.argsort(c_p * span + (c_sec - t0), kind="stable")
+    c_base, c_off = c_p[c_order] * span, c_sec[c_order] - t0
+
+    # one stable sort on (code, patient, time) -> one contiguous block per code; same-second ties keep
+    # file order, so "last" is the row that came last
+    order = np.argsort(cid.astype("int64") * block + o_key, kind="stable")
+    o_key, o_val, cid = o_key[order], o_val[order], cid[order]
+    used, first = np.unique(cid, return_index=True)
+    edges = np.append(first, len(cid))
+
+    feats = [f"{names[c]}_{st}_{w}" for c in used for w in windows for st in STATS]
+    mat = np.empty((len(c_sec), len(feats)), dtype="float32", order="F")  # rows in sorted-cutoff order
+    j = 0
+    for k in range(len(used)):
+        key, v = o_key[edges[k]:edges[k + 1]], o_val[edges[k]:edges[k + 1]]
+        # prefix sums on values centred per code keep sum-of-squares precise
+        centre = v.mean()
+        cs = np.concatenate([[0.0], np.cumsum(v - centre)])
+        cs2 = np.concatenate([[0.0], np.cumsum((v - centre) ** 2)])
+        v_pad = np.append(v, np.nan)  # reduceat index hi may equal len(v)
+
+        hi = np.searchsorted(key, c_base + c_off, side="right")  # at or before the cutoff
+        for delta in windows.values():
+            # clipped at -1 so the start lands on this patient's first row, never the previous patient's
+            lo = np.searchsorted(key, c_base + np.maximum(c_off - int(delta.total_seconds()), -1), side="right")
+            n = hi - lo
+            empty = n == 0
+            with np.errstate(invalid="ignore", divide="ignore"):
+                s = cs[hi] - cs[lo]
+                mean = s / n
+                std = np.sqrt(np.maximum(cs2[hi] - cs2[lo] - s * mean, 0.0) / (n - 1))  # ddof=1
+            bounds = np.column_stack([lo, hi]).ravel()
+            # an empty window is count 0 and NaN for everything else (mean/std are NaN already)
+            stats = {
+                "mean": mean + centre, "std": np.where(n > 1, std, np.nan),
+                "min": np.where(empty, np.nan, np.minimum.reduceat(v_pad, bounds)[::2]),
+                "max": np.where(empty, np.nan, np.maximum.reduceat(v_pad, bounds)[::2]),
+                "count": n, "last": np.where(empty, np.nan, v_pad[hi - 1]),
+            }
+            for st in STATS:
+                mat[:, j] = stats[st]
+                j += 1
+
+    feat = pd.DataFrame(mat, columns=feats, index=cutoffs.index[c_order])
+    return pd.concat([cutoffs.iloc[c_order], feat], axis=1)
+
+def main():
+    obs = pd.read_parquet(OBS, columns=["patient_id", "timestamp", "code", "value"])
+    cutoffs = load_cutoffs()
+    feat = compute_windowed_features(obs, cutoffs)
+
+    pathlib.Path("data/processed").mkdir(parents=True, exist_ok=True)
+    feat.to_parquet(OUT, index=False)
+    print(f"Wrote windowed features: {feat.shape[0]} cutoffs x {feat.shape[1]} cols -> {OUT}")
+
+if __name__ == "__main__":
+    main()
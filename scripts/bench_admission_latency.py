@@ -0,0 +1,59 @@
+# scripts/bench_admission_latency.py
+# Single-row /predict/admission scoring latency: old pandas path vs AdmissionScorer.
+# Run from the repo root after train/train_lr.py:  python -m scripts.bench_admission_latency
+import argparse, json, time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.admission_model import AdmissionScorer
+
+ROOT = Path(__file__).resolve().parents[1]
+
+def _old_path(model, feat_names, feats):
+    # the pre-AdmissionScorer handler: NaN dict -> one-row DataFrame -> predict_proba
+    x = {k: np.nan for k in feat_names}
+    for k, v in feats.items():
+        if k in x:
+            x[k] = v
+    return float(model.predict_proba(pd.DataFrame([x]))[:, 1][0])
+
+def _new_path(scorer, feats):
+    return scorer.predict_one(scorer.align(feats))
+
+def _time(fn, payloads):
+    lat = np.empty(len(payloads))
+    for i, p in enumerate(payloads):
+        t = time.perf_counter()
+        fn(p)
+        lat[i] = time.perf_counter() - t
+    return lat * 1e6  # microseconds
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=5000)
+    args = ap.parse_args()
+
+    model = joblib.load(ROOT / "models" / "admit_lr.joblib")
+    feat_names = json.loads((ROOT / "models" / "feature_list.json").read_text())
+    scorer = AdmissionScorer(model, feat_names)
+
+    rng = np.random.default_rng(42)
+    payloads = []
+    for _ in range(args.n):
+        keep = rng.random(len(feat_names)) < 0.7  # some features missing -> imputer path
+        payloads.append({k: float(v) for k, v, m in zip(feat_names, rng.normal(100, 20, len(feat_names)), keep) if m})
+
+    # parity + warm-up
+    diffs = [abs(_old_path(model, feat_names, p) - _new_path(scorer, p)) for p in payloads[:200]]
+    print(f"fast path: {scorer.fast_path}  max |old-new| over 200 rows: {max(diffs):.2e}")
+
+    for name, fn in [("before (dict -> DataFrame -> predict_proba)", lambda p: _old_path(model, feat_names, p)),
+                     ("after  (index map -> ndarray -> scorer)   ", lambda p: _new_path(scorer, p))]:
+        lat = _time(fn, payloads)
+        print(f"{name}  p50={np.percentile(lat, 50):8.1f} us  p99={np.percentile(lat, 99):8.1f} us")
+
+if __name__ == "__main__":
+    main()
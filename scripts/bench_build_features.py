@@ -0,0 +1,70 @@
+# scripts/bench_build_features.py
+# Feature engine: old groupby + melt + pivot vs the single sorted pass in features/build_features.py.
+# Run from the repo root:  python -m scripts.bench_build_features [--rows 10000000]
+import argparse, time, tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from features.build_features import STATS, compute_features
+
+CODES = ["HR", "BP_SYS", "BP_DIA", "RR", "TEMP_F", "SPO2", "50983", "50931", "51277", "51279"]
+
+def _synthetic(n, patients, seed=0):
+    # same dtypes as data/interim/observations.parquet (int64 / datetime64 / category / float32)
+    rng = np.random.default_rng(seed)
+    value = rng.normal(100, 20, n).astype("float32")
+    value[rng.random(n) < 0.01] = np.nan
+    return pd.DataFrame({
+        "patient_id": rng.integers(10_000_000, 10_000_000 + patients, n),
+        "timestamp": pd.Timestamp("2125-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365 * 86400, n), unit="s"),
+        "code": pd.Categorical.from_codes(rng.integers(0, len(CODES), n).astype("int8"), categories=CODES),
+        "value": value,
+    })
+
+def _pivot_features(df):
+    # what build_features did before: sort, two groupbys, concat, melt, pivot
+    df = df.dropna(subset=["value"])
+    df["value"] = df["value"].astype("float64")
+    df = df.sort_values(["patient_id", "code", "timestamp"])
+    last_val = df.groupby(["patient_id", "code"], observed=True)["value"].last().rename("last")
+    agg = df.groupby(["patient_id", "code"], observed=True)["value"].agg(mean="mean", std="std", min="min",
+                                                                         max="max", count="count")
+    wide = pd.concat([agg, last_val], axis=1).reset_index()
+    wide["feature_prefix"] = wide["code"].astype(str)
+    tidy = pd.melt(wide, id_vars=["patient_id", "code", "feature_prefix"], value_vars=STATS,
+                   var_name="stat", value_name="val")
+    tidy["feature"] = tidy["feature_prefix"] + "_" + tidy["stat"]
+    return tidy.pivot(index="patient_id", columns="feature", values="val").reset_index()
+
+def _measured(fn, df):
+    # tracemalloc sees numpy/pandas buffers; peak is relative to the already-loaded input frame
+    tracemalloc.start()
+    t = time.perf_counter()
+    out = fn(df)
+    secs = time.perf_counter() - t
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return secs, peak / 1e6, out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    ap.add_argument("--patients", type=int, default=200_000)
+    args = ap.parse_args()
+
+    df = _synthetic(args.rows, args.patients)
+    t_old, m_old, a = _measured(_pivot_features, df)
+    t_new, m_new, b = _measured(compute_features, df)
+
+    assert list(a.columns) == list(b.columns) and (a["patient_id"].to_numpy() == b["patient_id"].to_numpy()).all()
+    feats = a.columns[1:]
+    assert np.allclose(a[feats].to_numpy("float64"), b[feats].to_numpy("float64"), rtol=1e-5, equal_nan=True)
+
+    print(f"{args.rows:,} rows, {args.patients:,} patients -> {b.shape[0]:,} x {b.shape[1]} features")
+    print(f"  groupby+pivot  {t_old:6.2f}s  peak {m_old:8.1f} MB  output {a.memory_usage().sum() / 1e6:6.1f} MB")
+    print(f"  sorted pass    {t_new:6.2f}s  peak {m_new:8.1f} MB  output {b.memory_usage().sum() / 1e6:6.1f} MB")
+    print(f"  speedup  {t_old / t_new:.1f}x, peak memory {m_old / m_new:.1f}x lower")
+
+if __name__ == "__main__":
+    main()
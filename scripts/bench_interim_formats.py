@@ -0,0 +1,63 @@
+# scripts/bench_interim_formats.py
+# Interim observations table: CSV vs typed Parquet, write + downstream read end to end.
+# Run from the repo root:  python -m scripts.bench_interim_formats [--rows 2000000]
+import argparse, os, tempfile, time
+
+import numpy as np
+import pandas as pd
+
+from etl.interim import write_observations
+
+CODES = ["HR", "BP_SYS", "BP_DIA", "RR", "TEMP_F", "SPO2", "50983", "50931", "51277", "51279"]
+UNITS = ["bpm", "mmHg", "mmHg", "breaths/min", "°F", "%", "mEq/L", "mg/dL", "%", "m/uL"]
+
+def _synthetic(n, seed=0):
+    rng = np.random.default_rng(seed)
+    k = rng.integers(0, len(CODES), n)
+    return pd.DataFrame({
+        "patient_id": rng.integers(10_000_000, 10_050_000, n),
+        "timestamp": pd.Timestamp("2125-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365 * 86400, n), unit="s"),
+        "code": np.array(CODES)[k],
+        "value": np.round(rng.normal(100, 20, n), 1),
+        "unit": np.array(UNITS)[k],
+    })
+
+def _timed(fn):
+    t = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t, out
+
+def _read_csv(path):
+    # what build_features/run_checks did before: parse text, then coerce types
+    df = pd.read_csv(path)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+    df["value"] = pd.to_numeric(df["value"], errors="coerce")
+    return df
+
+def _read_parquet(path):
+    return pd.read_parquet(path, columns=["patient_id", "timestamp", "code", "value"])
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    args = ap.parse_args()
+
+    df = _synthetic(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "observations.csv")
+        pq_path = os.path.join(tmp, "observations.parquet")
+        w_csv, _ = _timed(lambda: df.to_csv(csv_path, index=False))
+        w_pq, _ = _timed(lambda: write_observations(df, pq_path))
+        r_csv, a = _timed(lambda: _read_csv(csv_path))
+        r_pq, b = _timed(lambda: _read_parquet(pq_path))
+        assert np.allclose(a["value"].to_numpy(), b["value"].to_numpy())
+        assert (a["timestamp"].to_numpy() == b["timestamp"].to_numpy()).all()
+        mb = {p: os.path.getsize(p) / 1e6 for p in (csv_path, pq_path)}
+
+    print(f"{args.rows:,} rows")
+    print(f"  csv      write {w_csv:6.2f}s  read+parse {r_csv:6.2f}s  total {w_csv + r_csv:6.2f}s  {mb[csv_path]:7.1f} MB")
+    print(f"  parquet  write {w_pq:6.2f}s  read       {r_pq:6.2f}s  total {w_pq + r_pq:6.2f}s  {mb[pq_path]:7.1f} MB")
+    print(f"  speedup  {(w_csv + r_csv) / (w_pq + r_pq):.1f}x end to end, {r_csv / r_pq:.1f}x on the downstream read")
+
+if __name__ == "__main__":
+    main()
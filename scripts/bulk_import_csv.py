@@ -0,0 +1,166 @@
+# scripts/bulk_import_csv.py
+"""
+Write node/relationship CSVs for `neo4j-admin database import full` (initial loads only;
+the importer needs an empty database). Same labels and keys as the Cypher loaders, so
+ensure_*_constraints and later incremental runs work on the imported graph.
+Sources are streamed; only the small key sets (patients, stays, complaints) are kept.
+"""
+from pathlib import Path
+import csv, time
+import pandas as pd
+import load_mimic_neo4j as mimic
+import load_synthea_neo4j as synthea
+
+class _CsvOut:
+    """One header file plus one streamed data file for a node label or relationship type."""
+
+    def __init__(self, out_dir, name, header):
+        self.header = out_dir / f"{name}_header.csv"
+        self.header.write_text(",".join(header) + "\n", encoding="utf-8")
+        self.path = out_dir / f"{name}.csv"
+        self.f = open(self.path, "w", newline="", encoding="utf-8")
+        self.w = csv.writer(self.f)
+        self.rows = 0
+
+    def row(self, *vals):
+        self.w.writerow(vals)
+        self.rows += 1
+
+    def frame(self, df):
+        df.to_csv(self.f, header=False, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        self.f.close()
+
+    def arg(self):
+        return f"{self.header.name},{self.path.name}"
+
+def _command(nodes, rels, database):
+    parts = ["neo4j-admin database import full"]
+    parts += [f"--nodes={label}={out.arg()}" for label, out in nodes]
+    parts += [f"--relationships={rtype}={out.arg()}" for rtype, out in rels]
+    parts += ["--skip-duplicate-nodes=true", "--skip-bad-relationships=true", "--multiline-fields=true",
+              database or "neo4j"]
+    return " \\\n    ".join(parts)
+
+def _finish(out_dir, nodes, rels, database, t0):
+    for _, out in nodes + rels:
+        out.close()
+        print(f"  {out.path.name}: {out.rows:,} rows")
+    cmd = _command(nodes, rels, database)
+    (out_dir / "import.sh").write_text(f"cd \"$(dirname \"$0\")\"\n{cmd}\n", encoding="utf-8")
+    print(f"✅ Wrote bulk-import CSVs to {out_dir} in {time.perf_counter() - t0:.1f}s. From that folder run:\n{cmd}")
+
+def write_mimic(out_dir, chunk_rows=mimic.BATCH_ROWS, database=None):
+    t0 = time.perf_counter()
+    patient = _CsvOut(out_dir, "mimic_patient", [":ID(Patient)", "subject_id:long"])
+    stay = _CsvOut(out_dir, "mimic_edstay", [":ID(EDStay)", "stay_id:long"])
+    vital = _CsvOut(out_dir, "mimic_vital", [":ID(Vital)", "stay_id:long", "charttime", "temperature:double",
+                                             "heartrate:double", "resprate:double", "o2sat:double",
+                                             "sbp:double", "dbp:double"])
+    complaint = _CsvOut(out_dir, "mimic_complaint", [":ID(Complaint)", "text"])
+    had_stay = _CsvOut(out_dir, "mimic_had_ed_stay", [":START_ID(Patient)", ":END_ID(EDStay)"])
+    has_vital = _CsvOut(out_dir, "mimic_has_vital", [":START_ID(EDStay)", ":END_ID(Vital)"])
+    has_complaint = _CsvOut(out_dir, "mimic_has_complaint", [":START_ID(EDStay)", ":END_ID(Complaint)"])
+    subjects, stays, texts = set(), set(), set()
+
+    def _stays(chunk):
+        for subject_id, stay_id in chunk[["subject_id", "stay_id"]].drop_duplicates().itertuples(index=False):
+            if subject_id not in subjects:
+                subjects.add(subject_id)
+                patient.row(subject_id, subject_id)
+            if stay_id not in stays:
+                stays.add(stay_id)
+                stay.row(stay_id, stay_id)
+                had_stay.row(subject_id, stay_id)
+
+    def _read(name, usecols):
+        # nullable ids: a row missing subject_id/stay_id is dropped instead of failing the whole file
+        for chunk in pd.read_csv(mimic.BASE / name, compression="gzip", usecols=lambda c: c in usecols,
+                                 dtype={"subject_id": "Int64", "stay_id": "Int64"}, chunksize=chunk_rows):
+            chunk = chunk.dropna(subset=["subject_id", "stay_id"])
+            yield chunk.astype({"subject_id": "int64", "stay_id": "int64"})
+
+    for chunk in _read("vitalsign.csv.gz", mimic.VITAL_COLS):
+        _stays(chunk)
+        # same key the Cypher loader MERGEs on: (stay_id, charttime)
+        vid = chunk["stay_id"].astype(str) + "|" + chunk["charttime"].astype(str)
+        cols = ["stay_id", "charttime", "temperature", "heartrate", "resprate", "o2sat", "sbp", "dbp"]
+        vital.frame(pd.concat([vid.rename("id"), chunk.reindex(columns=cols)], axis=1))
+        has_vital.frame(pd.DataFrame({"stay_id": chunk["stay_id"], "id": vid}))
+
+    for chunk in _read("triage.csv.gz", mimic.TRIAGE_COLS):
+        _stays(chunk)
+        chunk = chunk[chunk["chiefcomplaint"].notna() & (chunk["chiefcomplaint"] != "")]
+        for stay_id, text in chunk[["stay_id", "chiefcomplaint"]].drop_duplicates().itertuples(index=False):
+            if text not in texts:
+                texts.add(text)
+                complaint.row(text, text)
+            has_complaint.row(stay_id, text)
+
+    nodes = [("Patient", patient), ("EDStay", stay), ("Vital", vital), ("Complaint", complaint)]
+    rels = [("HAD_ED_STAY", had_stay), ("HAS_VITAL", has_vital), ("HAS_COMPLAINT", has_complaint)]
+    _finish(out_dir, nodes, rels, database, t0)
+
+def write_synthea(out_dir, database=None):
+    t0 = time.perf_counter()
+    patient = _CsvOut(out_dir, "synthea_patient", ["id:ID(Patient)", "name", "birthDate"])
+    encounter = _CsvOut(out_dir, "synthea_encounter", ["id:ID(Encounter)", "start", "end", "type"])
+    observation = _CsvOut(out_dir, "synthea_observation", ["id:ID(Observation)", "loinc", "display",
+                                                           "value:double", "unit", "time"])
+    loaded = _CsvOut(out_dir, "synthea_loaded_file", ["path:ID(LoadedFile)", "sha256", "size:long",
+                                                      "mtime_ns:long"])
+    had_enc = _CsvOut(out_dir, "synthea_had_encounter", [":START_ID(Patient)", ":END_ID(Encounter)"])
+    enc_obs = _CsvOut(out_dir, "synthea_encounter_observation", [":START_ID(Encounter)", ":END_ID(Observation)"])
+    pat_obs = _CsvOut(out_dir, "synthea_patient_observation", [":START_ID(Patient)", ":END_ID(Observation)"])
+    patients = set()
+
+    for fp in sorted(synthea.FHIR_DIR.rglob("*.json")):
+        # a bundle that fails to parse partway contributes nothing: rows are buffered per file
+        # and written only after a clean parse
+        encounters = set()  # Synthea bundles are self-contained: encounters precede their observations
+        new_patients, rows = set(), []
+        try:
+            for r in synthea._iter_file(fp):
+                item = synthea._row(r)
+                if not item:
+                    continue
+                kind, row = item
+                if kind == "Patient":
+                    if row["id"] not in patients and row["id"] not in new_patients:
+                        new_patients.add(row["id"])
+                        rows.append((patient, (row["id"], row["name"], row["birthDate"])))
+                elif kind == "Encounter":
+                    encounters.add(row["id"])
+                    rows.append((encounter, (row["id"], row["start"], row["end"], row["type"])))
+                    rows.append((had_enc, (row["patient_id"], row["id"])))
+                else:
+                    rows.append((observation, (row["id"], row["loinc"], row["display"], row["value"],
+                                               row["unit"], row["time"])))
+                    # Link to Encounter if available, else to Patient
+                    if row["encounter_id"] in encounters:
+                        rows.append((enc_obs, (row["encounter_id"], row["id"])))
+                    elif row["patient_id"]:
+                        rows.append((pat_obs, (row["patient_id"], row["id"])))
+        except Exception as e:
+            print(f"[WARN] Skipping {fp.name}: {e}")
+            continue
+        patients |= new_patients
+        for out, vals in rows:
+            out.row(*vals)
+        st = fp.stat()
+        loaded.row(fp.relative_to(synthea.FHIR_DIR).as_posix(), synthea._sha256(fp), st.st_size, st.st_mtime_ns)
+
+    nodes = [("Patient", patient), ("Encounter", encounter), ("Observation", observation),
+             ("LoadedFile", loaded)]
+    rels = [("HAD_ENCOUNTER", had_enc), ("HAS_OBSERVATION", enc_obs), ("HAS_OBSERVATION", pat_obs)]
+    _finish(out_dir, nodes, rels, database, t0)
+
+def run(source, out_dir, chunk_rows=None, database=None):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if source == "synthea":
+        write_synthea(out_dir, database)
+    else:
+        write_mimic(out_dir, chunk_rows or mimic.BATCH_ROWS, database)
@@ -1,59 +1,126 @@
 # scripts/load_mimic_neo4j.py
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
+import os, time
 import pandas as pd
 from neo4j_common import get_driver, ensure_mimic_constraints
 
-BASE = Path(r"C:\Users\yangm\Desktop\Mayo-Demo\data\physionet.org\files\mimic-iv-ed-demo\2.2\ed")
+BASE = Path(os.getenv("MIMIC_ED_DIR", r"C:\Users\yangm\Desktop\Mayo-Demo\data\physionet.org\files\mimic-iv-ed-demo\2.2\ed"))
+BATCH_ROWS = 10_000  # rows per transaction
 
-def run(database=None):
-    vitals = pd.read_csv(BASE / "vitalsign.csv.gz", compression="gzip")
-    triage = pd.read_csv(BASE / "triage.csv.gz",    compression="gzip")
+VITAL_COLS = ["subject_id", "stay_id", "charttime", "temperature", "heartrate", "resprate", "o2sat", "sbp", "dbp"]
+TRIAGE_COLS = ["subject_id", "stay_id", "chiefcomplaint"]
 
-    # Keep it snappy for demos; remove .head(...) for full load
-    vitals = vitals.head(5000)
-    triage = triage.head(2000)
+STAYS_Q = """
+UNWIND $rows AS r
+MERGE (p:Patient {subject_id: toInteger(r.subject_id)})
+MERGE (e:EDStay  {stay_id:   toInteger(r.stay_id)})
+MERGE (p)-[:HAD_ED_STAY]->(e)
+"""
 
+# MERGE on (stay_id, charttime) keeps re-runs idempotent (CREATE duplicated every Vital)
+VITALS_Q = """
+UNWIND $rows AS r
+MATCH (e:EDStay {stay_id: toInteger(r.stay_id)})
+MERGE (v:Vital {stay_id: toInteger(r.stay_id), charttime: r.charttime})
+SET v.temperature = toFloat(r.temperature),
+    v.heartrate = toFloat(r.heartrate),
+    v.resprate = toFloat(r.resprate),
+    v.o2sat = toFloat(r.o2sat),
+    v.sbp = toFloat(r.sbp),
+    v.dbp = toFloat(r.dbp)
+MERGE (e)-[:HAS_VITAL]->(v)
+"""
+
+COMPLAINTS_Q = """
+UNWIND $rows AS r
+MATCH (e:EDStay {stay_id: toInteger(r.stay_id)})
+WITH e, r WHERE r.chiefcomplaint IS NOT NULL AND r.chiefcomplaint <> ''
+MERGE (c:Complaint {text: r.chiefcomplaint})
+MERGE (e)-[:HAS_COMPLAINT]->(c)
+"""
+
+def _records(df):
+    # NaN -> null so Neo4j stores missing vitals as absent, not NaN
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+def _write_batch(session, chunk, row_query):
+    """One chunk = two managed transactions (retried by the driver on transient errors)."""
+    pairs = _records(chunk[["subject_id", "stay_id"]].drop_duplicates())
+    session.execute_write(lambda tx: tx.run(STAYS_Q, rows=pairs).consume())
+    rows = _records(chunk)
+    session.execute_write(lambda tx: tx.run(row_query, rows=rows).consume())
+    return len(chunk)
+
+class _Partitions:
+    """
+    `workers` single-thread lanes, each with its own session. Rows are routed by
+    subject_id % workers, so a Patient and all of its stays are always written by the same
+    lane (no lock fights on them) while different patients load in parallel.
+    serial=True sends whole chunks to lane 0: for queries that MERGE nodes shared across
+    patients (Complaint), which parallel lanes would otherwise deadlock on.
+    """
+
+    def __init__(self, driver, database, workers):
+        self.workers = max(1, workers)
+        self.lanes = [ThreadPoolExecutor(max_workers=1) for _ in range(self.workers)]
+        self.sessions = [driver.session(database=database) for _ in range(self.workers)]
+        self.pending = set()
+
+    def submit(self, chunk, row_query, serial=False):
+        if serial or self.workers == 1:
+            parts = [(0, chunk)]
+        else:
+            parts = chunk.groupby(chunk["subject_id"] % self.workers)
+        for k, part in parts:
+            self.pending.add(self.lanes[k].submit(_write_batch, self.sessions[k], part, row_query))
+        # bounded in-flight work keeps memory flat on multi-GB inputs
+        while len(self.pending) > 2 * self.workers:
+            done, self.pending = wait(self.pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                f.result()
+
+    def drain(self):
+        pending, self.pending = self.pending, set()
+        for f in wait(pending).done:
+            f.result()
+
+    def close(self):
+        for lane in self.lanes:
+            lane.shutdown(wait=True)
+        for s in self.sessions:
+            s.close()
+
+def _load_file(parts, path, usecols, row_query, batch_size, limit, serial=False):
+    t0, n = time.perf_counter(), 0
+    # nullable ints: a missing id becomes <NA> and is dropped below instead of failing the cast
+    reader = pd.read_csv(path, compression="gzip", usecols=lambda c: c in usecols,
+                         dtype={"subject_id": "Int64", "stay_id": "Int64"}, chunksize=batch_size, nrows=limit)
+    for chunk in reader:
+        chunk = chunk.dropna(subset=["subject_id", "stay_id"])
+        chunk = chunk.astype({"subject_id": "int64", "stay_id": "int64"})
+        parts.submit(chunk, row_query, serial)
+        n += len(chunk)
+    parts.drain()
+    secs = time.perf_counter() - t0
+    print(f"  {path.name}: {n:,} rows in {secs:.1f}s ({n / secs if secs else 0:,.0f} rows/s)")
+    return n
+
+def run(database=None, batch_size=BATCH_ROWS, workers=1, limit=None):
+    """
+    Stream vitalsign.csv.gz and triage.csv.gz in `batch_size`-row chunks, one transaction
+    pair per chunk, fanned out over `workers` sessions. `limit` caps rows per file (demo runs).
+    """
     driver = get_driver()
     with driver.session(database=database) as session:
         ensure_mimic_constraints(session)
 
-        # Merge Patients + ED stays
-        pairs = (pd.concat([vitals[['subject_id','stay_id']],
-                            triage[['subject_id','stay_id']]])
-                 .drop_duplicates()
-                 .to_dict('records'))
-
-        session.run("""
-        UNWIND $rows AS r
-        MERGE (p:Patient {subject_id: toInteger(r.subject_id)})
-        MERGE (e:EDStay  {stay_id:   toInteger(r.stay_id)})
-        MERGE (p)-[:HAD_ED_STAY]->(e)
-        """, rows=pairs)
-
-        # Attach vitals
-        session.run("""
-        UNWIND $rows AS r
-        MATCH (e:EDStay {stay_id: toInteger(r.stay_id)})
-        CREATE (v:Vital {
-          charttime: r.charttime,
-          temperature: toFloat(r.temperature),
-          heartrate: toFloat(r.heartrate),
-          resprate: toFloat(r.resprate),
-          o2sat: toFloat(r.o2sat),
-          sbp: toFloat(r.sbp),
-          dbp: toFloat(r.dbp)
-        })
-        MERGE (e)-[:HAS_VITAL]->(v)
-        """, rows=vitals.to_dict('records'))
-
-        # Attach chief complaints
-        session.run("""
-        UNWIND $rows AS r
-        MATCH (e:EDStay {stay_id: toInteger(r.stay_id)})
-        WITH e, r WHERE r.chiefcomplaint IS NOT NULL AND r.chiefcomplaint <> ''
-        MERGE (c:Complaint {text: r.chiefcomplaint})
-        MERGE (e)-[:HAS_COMPLAINT]->(c)
-        """, rows=triage.to_dict('records'))
-
-    driver.close()
+    parts = _Partitions(driver, database, workers)
+    try:
+        _load_file(parts, BASE / "vitalsign.csv.gz", VITAL_COLS, VITALS_Q, batch_size, limit)
+        # Attach chief complaints; Complaint nodes are shared by many patients -> one lane
+        _load_file(parts, BASE / "triage.csv.gz", TRIAGE_COLS, COMPLAINTS_Q, batch_size, limit, serial=True)
+    finally:
+        parts.close()
+        driver.close()
     print("✅ Loaded MIMIC-ED into Neo4j.")
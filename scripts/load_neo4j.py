@@ -1,19 +1,37 @@
 
 # scripts/load_neo4j.py
-import argparse, importlib, os
+import argparse, importlib, inspect, os
+from neo4j_common import notify_api_kg_changed
 
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--source", choices=["synthea","mimic"], default=os.getenv("DATA_SOURCE","mimic"))
     p.add_argument("--database", default=os.getenv("NEO4J_DB"))
+    p.add_argument("--batch-size", type=int, default=None, help="rows per transaction")
+    p.add_argument("--workers", type=int, default=None, help="parallel sessions")
+    p.add_argument("--full", action="store_true", help="reload every file, ignoring incremental watermarks")
+    sub = p.add_subparsers(dest="command")
+    bulk = sub.add_parser("bulk-csv", help="write CSVs for neo4j-admin database import instead of loading")
+    bulk.add_argument("--out", default=os.getenv("NEO4J_IMPORT_DIR", "import"))
+    bulk.add_argument("--chunk-rows", type=int, default=None)
     args = p.parse_args()
 
+    if args.command == "bulk-csv":
+        import bulk_import_csv
+        bulk_import_csv.run(args.source, args.out, chunk_rows=args.chunk_rows, database=args.database)
+        return
+
     mod = "load_synthea_neo4j" if args.source == "synthea" else "load_mimic_neo4j"
     loader = importlib.import_module(mod)
     if hasattr(loader, "run"):
-        loader.run(database=args.database)
+        opts = {"batch_size": args.batch_size, "workers": args.workers,
+                "incremental": False if args.full else None}
+        accepted = inspect.signature(loader.run).parameters
+        kwargs = {k: v for k, v in opts.items() if v is not None and k in accepted}
+        loader.run(database=args.database, **kwargs)
     else:
         loader.main()
+    notify_api_kg_changed()
 
 if __name__ == "__main__":
     main()
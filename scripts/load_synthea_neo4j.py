@@ -1,126 +1,299 @@
 # scripts/load_synthea_neo4j.py
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import json
-import pandas as pd
+import atexit, hashlib, json, os, time
 from neo4j_common import get_driver, ensure_synthea_constraints
 
+try:
+    import ijson  # optional: streams bundles entry by entry instead of json.load-ing them whole
+except ImportError:
+    ijson = None
+
 # Point this to your Synthea FHIR output
-FHIR_DIR = Path(r"C:\Users\yangm\Desktop\Mayo-Demo\output\fhir")
+FHIR_DIR = Path(os.getenv("SYNTHEA_FHIR_DIR", r"C:\Users\yangm\Desktop\Mayo-Demo\output\fhir"))
+BATCH_ROWS = 5_000  # rows buffered (all kinds) before a write
 
-def _iter_resources():
-    """Yield FHIR resources from all .json files (handles Bundle or single resource)."""
-    for fp in FHIR_DIR.rglob("*.json"):
-        try:
-            with open(fp, encoding="utf-8") as f:
-                doc = json.load(f)
-        except Exception:
-            continue
-        if isinstance(doc, dict) and doc.get("resourceType") == "Bundle":
-            for e in doc.get("entry", []):
-                r = e.get("resource")
-                if r:
-                    yield r
-        elif isinstance(doc, dict) and doc.get("resourceType"):
-            yield doc
-        elif isinstance(doc, list):
-            for r in doc:
-                if isinstance(r, dict) and r.get("resourceType"):
-                    yield r
+# Pass 1: nodes only, each MERGE is a single lookup on the constraint-backed id
+PATIENTS_Q = """
+UNWIND $rows AS r
+MERGE (p:Patient {id: r.id})
+SET p.name = r.name, p.birthDate = r.birthDate
+"""
+
+ENCOUNTERS_Q = """
+UNWIND $rows AS r
+MERGE (e:Encounter {id: r.id})
+SET e.start = r.start, e.end = r.end, e.type = r.type
+"""
+
+OBSERVATIONS_Q = """
+UNWIND $rows AS r
+MERGE (o:Observation {id: r.id})
+SET o.loinc = r.loinc, o.display = r.display,
+    o.value = toFloat(r.value), o.unit = r.unit, o.time = r.time
+"""
+
+# Pass 2: relationships, MERGEing each endpoint by its constraint-backed id. An endpoint whose
+# own row lands in another batch, file or pool worker is created here as a bare {id} stub and
+# filled in when its node pass runs (MERGE + SET), so no edge depends on write order.
+HAD_ENCOUNTER_Q = """
+UNWIND $rows AS r
+MERGE (p:Patient {id: r.patient_id})
+MERGE (e:Encounter {id: r.id})
+MERGE (p)-[:HAD_ENCOUNTER]->(e)
+"""
+
+# Observation -> its Encounter when it names one, else -> its Patient
+OBS_ENCOUNTER_Q = """
+UNWIND $rows AS r
+WITH r WHERE r.encounter_id IS NOT NULL
+MERGE (e:Encounter {id: r.encounter_id})
+MERGE (o:Observation {id: r.id})
+MERGE (e)-[:HAS_OBSERVATION]->(o)
+"""
+
+OBS_PATIENT_Q = """
+UNWIND $rows AS r
+WITH r WHERE r.encounter_id IS NULL AND r.patient_id IS NOT NULL
+MERGE (p:Patient {id: r.patient_id})
+MERGE (o:Observation {id: r.id})
+MERGE (p)-[:HAS_OBSERVATION]->(o)
+"""
+
+LOADED_FILES_Q = """
+MATCH (f:LoadedFile) RETURN f.path AS path, f.sha256 AS sha256, f.size AS size, f.mtime_ns AS mtime_ns
+"""
+
+MARK_FILES_Q = """
+UNWIND $rows AS r
+MERGE (f:LoadedFile {path: r.path})
+SET f.sha256 = r.sha256, f.size = r.size, f.mtime_ns = r.mtime_ns, f.loaded_at = datetime()
+"""
+
+# nodes first so most endpoints already carry their properties; edges never need them to
+NODE_PASS = [("Patient", PATIENTS_Q), ("Encounter", ENCOUNTERS_Q), ("Observation", OBSERVATIONS_Q)]
+REL_PASS = [("Encounter", HAD_ENCOUNTER_Q), ("Observation", OBS_ENCOUNTER_Q), ("Observation", OBS_PATIENT_Q)]
+
+def _iter_file(fp):
+    """Yield FHIR resources from one .json file (handles Bundle, list, or single resource)."""
+    if ijson is None:
+        yield from _iter_doc(fp)
+        return
+    with open(fp, "rb") as f:
+        head = f.read(64).lstrip()
+        f.seek(0)
+        if head.startswith(b"["):
+            yield from (r for r in ijson.items(f, "item", use_float=True)
+                        if isinstance(r, dict) and r.get("resourceType"))
+            return
+        found = False
+        for r in ijson.items(f, "entry.item.resource", use_float=True):
+            found = True
+            yield r
+    if not found:  # not a Bundle: a lone resource is small enough to load whole
+        yield from _iter_doc(fp)
+
+def _iter_doc(fp):
+    with open(fp, encoding="utf-8") as f:
+        doc = json.load(f)
+    if isinstance(doc, dict) and doc.get("resourceType") == "Bundle":
+        for e in doc.get("entry", []):
+            r = e.get("resource")
+            if r:
+                yield r
+    elif isinstance(doc, dict) and doc.get("resourceType"):
+        yield doc
+    elif isinstance(doc, list):
+        for r in doc:
+            if isinstance(r, dict) and r.get("resourceType"):
+                yield r
 
 def _ref_id(ref):
-    """FHIR reference like 'Patient/123' → '123'."""
+    """FHIR reference like 'Patient/123' or 'urn:uuid:123' (Synthea bundles) → '123'."""
     if not ref:
         return None
-    return str(ref).split("/")[-1]
-
-def run(database=None, limit=None):
-    # Collect simple tabular rows for batching
-    patients, encounters, observations = [], [], []
-
-    for r in _iter_resources():
-        rt = r.get("resourceType")
-        if rt == "Patient":
-            patients.append({
-                "id": r.get("id"),
-                "name": (r.get("name") or [{}])[0].get("text") or
-                        " ".join((r.get("name") or [{}])[0].get("given", [])) + " " +
-                        ((r.get("name") or [{}])[0].get("family") or ""),
-                "birthDate": r.get("birthDate")
-            })
-        elif rt == "Encounter":
-            encounters.append({
-                "id": r.get("id"),
-                "patient_id": _ref_id((r.get("subject") or {}).get("reference")),
-                "start": (r.get("period") or {}).get("start"),
-                "end":   (r.get("period") or {}).get("end"),
-                "type":  ((r.get("type") or [{}])[0].get("text")) if r.get("type") else None
-            })
-        elif rt == "Observation":
-            code = (((r.get("code") or {}).get("coding") or [{}])[0])
-            valq = r.get("valueQuantity") or {}
-            observations.append({
-                "id": r.get("id"),
-                "patient_id": _ref_id((r.get("subject") or {}).get("reference")),
-                "encounter_id": _ref_id((r.get("encounter") or {}).get("reference")),
-                "loinc": code.get("code"),
-                "display": code.get("display"),
-                "value": valq.get("value"),
-                "unit": valq.get("unit"),
-                "time": r.get("effectiveDateTime")
-            })
-
-        if limit and (len(patients)+len(encounters)+len(observations)) > limit:
+    return str(ref).split("/")[-1].removeprefix("urn:uuid:")
+
+def _row(r):
+    """Flatten a resource into a tabular row, or None for types (or rows) we don't load."""
+    rt = r.get("resourceType")
+    if rt == "Patient":
+        row = {
+            "id": r.get("id"),
+            "name": (r.get("name") or [{}])[0].get("text") or
+                    " ".join((r.get("name") or [{}])[0].get("given", [])) + " " +
+                    ((r.get("name") or [{}])[0].get("family") or ""),
+            "birthDate": r.get("birthDate")
+        }
+    elif rt == "Encounter":
+        row = {
+            "id": r.get("id"),
+            "patient_id": _ref_id((r.get("subject") or {}).get("reference")),
+            "start": (r.get("period") or {}).get("start"),
+            "end":   (r.get("period") or {}).get("end"),
+            "type":  ((r.get("type") or [{}])[0].get("text")) if r.get("type") else None
+        }
+        if row["patient_id"] is None:
+            return None
+    elif rt == "Observation":
+        code = (((r.get("code") or {}).get("coding") or [{}])[0])
+        valq = r.get("valueQuantity") or {}
+        row = {
+            "id": r.get("id"),
+            "patient_id": _ref_id((r.get("subject") or {}).get("reference")),
+            "encounter_id": _ref_id((r.get("encounter") or {}).get("reference")),
+            "loinc": code.get("code"),
+            "display": code.get("display"),
+            "value": valq.get("value"),
+            "unit": valq.get("unit"),
+            "time": r.get("effectiveDateTime")
+        }
+    else:
+        return None
+    return (rt, row) if row["id"] else None
+
+class _BatchWriter:
+    """
+    Buffers rows per kind; at `batch_size` rows total it runs the node pass for every kind,
+    then the relationship pass, then records the files whose rows are now all written.
+    """
+
+    def __init__(self, session, batch_size):
+        self.session = session
+        self.batch_size = max(1, batch_size)
+        self.buf = {kind: [] for kind, _ in NODE_PASS}
+        self.buffered = 0
+        self.counts = {kind: 0 for kind, _ in NODE_PASS}
+        self.finished = []  # LoadedFile rows waiting for the flush that covers them
+
+    def add(self, kind, row):
+        self.buf[kind].append(row)
+        self.buffered += 1
+        if self.buffered >= self.batch_size:
+            self.flush()
+
+    def file_done(self, mark):
+        self.finished.append(mark)
+
+    def _write(self, query, rows):
+        if rows:
+            self.session.execute_write(lambda tx: tx.run(query, rows=rows).consume())
+
+    def flush(self):
+        for kind, query in NODE_PASS:
+            self._write(query, self.buf[kind])
+        for kind, query in REL_PASS:
+            self._write(query, self.buf[kind])
+        for kind, rows in self.buf.items():
+            self.counts[kind] += len(rows)
+            self.buf[kind] = []
+        self.buffered = 0
+        self._write(MARK_FILES_Q, self.finished)
+        self.finished = []
+
+def _load_files(session, files, batch_size, limit=None):
+    """files: (path, LoadedFile row) pairs. A file cut short by `limit` is not marked as loaded."""
+    w = _BatchWriter(session, batch_size)
+    seen = 0
+    for fp, mark in files:
+        try:
+            for r in _iter_file(fp):
+                item = _row(r)
+                if item:
+                    w.add(*item)
+                    seen += 1
+                if limit and seen > limit:
+                    break
+            else:
+                w.file_done(mark)
+        except Exception as e:
+            print(f"[WARN] Skipping {fp.name}: {e}")
+        if limit and seen > limit:
             break
+    w.flush()
+    return w.counts
 
-    # Convert to records for Neo4j
-    p_rows = pd.DataFrame(patients).dropna(subset=["id"]).to_dict("records")
-    e_rows = pd.DataFrame(encounters).dropna(subset=["id","patient_id"]).to_dict("records")
-    o_rows = pd.DataFrame(observations).dropna(subset=["id"]).to_dict("records")
+def _sha256(fp):
+    h = hashlib.sha256()
+    with open(fp, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
 
+def _plan(session, paths, incremental):
+    """
+    Split bundles into (to load, unchanged) against the LoadedFile watermarks.
+      - same size + mtime as last load: unchanged without reading the file
+      - otherwise hash it; same content hash is still unchanged (watermark is refreshed)
+    """
+    known = {r["path"]: r for r in session.run(LOADED_FILES_Q)} if incremental else {}
+    todo, unchanged, touched = [], [], []
+    for fp in paths:
+        st = fp.stat()
+        mark = {"path": fp.relative_to(FHIR_DIR).as_posix(), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        prev = known.get(mark["path"])
+        if prev and prev["size"] == mark["size"] and prev["mtime_ns"] == mark["mtime_ns"]:
+            unchanged.append(mark)
+            continue
+        mark["sha256"] = _sha256(fp)
+        if prev and prev["sha256"] == mark["sha256"]:
+            unchanged.append(mark)
+            touched.append(mark)
+            continue
+        todo.append((fp, mark))
+    if touched:
+        session.execute_write(lambda tx: tx.run(MARK_FILES_Q, rows=touched).consume())
+    return todo, unchanged
+
+# --- process-pool workers: one driver per process, reused for every file it gets ---
+_worker = {}
+
+def _init_worker(database, batch_size):
+    _worker["driver"] = get_driver()
+    _worker["database"] = database
+    _worker["batch_size"] = batch_size
+    atexit.register(_worker["driver"].close)
+
+def _load_one(item):
+    with _worker["driver"].session(database=_worker["database"]) as sess:
+        return _load_files(sess, [item], _worker["batch_size"])
+
+def run(database=None, limit=None, batch_size=BATCH_ROWS, workers=1, incremental=True):
+    """
+    Stream bundles under FHIR_DIR into Neo4j in `batch_size`-row writes; memory stays
+    bounded by one batch per worker regardless of corpus size.
+      - incremental (default) skips bundles whose content hash matches their LoadedFile
+        watermark; incremental=False reloads everything (and refreshes the watermarks)
+      - workers > 1 loads files in a process pool (parsing is CPU bound)
+      - `limit` caps the number of resources (serial only, for quick demo runs)
+    """
+    t0 = time.perf_counter()
+    if ijson is None:
+        print("[WARN] ijson not installed: every bundle is json.load-ed whole (pip install ijson to stream)")
+    paths = sorted(FHIR_DIR.rglob("*.json"))
     driver = get_driver()
     with driver.session(database=database) as sess:
         ensure_synthea_constraints(sess)
+        todo, unchanged = _plan(sess, paths, incremental)
+        if workers <= 1 or limit:
+            counts = _load_files(sess, todo, batch_size, limit)
+    driver.close()
 
-        if p_rows:
-            sess.run("""
-            UNWIND $rows AS r
-            MERGE (p:Patient {id: r.id})
-            SET p.name = r.name, p.birthDate = r.birthDate
-            """, rows=p_rows)
-
-        if e_rows:
-            sess.run("""
-            UNWIND $rows AS r
-            MERGE (e:Encounter {id: r.id})
-            SET e.start = r.start, e.end = r.end, e.type = r.type
-            WITH r, e
-            MATCH (p:Patient {id: r.patient_id})
-            MERGE (p)-[:HAD_ENCOUNTER]->(e)
-            """, rows=e_rows)
-
-        if o_rows:
-            # Link to Encounter if available, else to Patient
-            sess.run("""
-            UNWIND $rows AS r
-            MERGE (o:Observation {id: r.id})
-            SET o.loinc = r.loinc, o.display = r.display,
-                o.value = toFloat(r.value), o.unit = r.unit, o.time = r.time
-            WITH r, o
-            OPTIONAL MATCH (e:Encounter {id: r.encounter_id})
-            WITH r, o, e
-            FOREACH (_ IN CASE WHEN e IS NOT NULL THEN [1] ELSE [] END |
-                MERGE (e)-[:HAS_OBSERVATION]->(o)
-            )
-            WITH r, o, e
-            OPTIONAL MATCH (p:Patient {id: r.patient_id})
-            WITH r, o, e, p
-            FOREACH (_ IN CASE WHEN e IS NULL AND p IS NOT NULL THEN [1] ELSE [] END |
-                MERGE (p)-[:HAS_OBSERVATION]->(o)
-            )
-            """, rows=o_rows)
+    if workers > 1 and not limit:
+        counts = {kind: 0 for kind, _ in NODE_PASS}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(database, batch_size)) as pool:
+            for c in pool.map(_load_one, todo):
+                for kind, n in c.items():
+                    counts[kind] += n
 
-    driver.close()
-    print(f"✅ Loaded Synthea FHIR into Neo4j ({len(p_rows)} patients, {len(e_rows)} encounters, {len(o_rows)} observations).")
+    secs = time.perf_counter() - t0
+    total = sum(counts.values())
+    skipped_mb = sum(m["size"] for m in unchanged) / 1e6
+    print(f"   skipped {len(unchanged)}/{len(paths)} unchanged files ({skipped_mb:,.1f} MB), "
+          f"loaded {len(todo)} new or changed")
+    print(f"✅ Loaded Synthea FHIR into Neo4j ({counts['Patient']} patients, {counts['Encounter']} encounters, "
+          f"{counts['Observation']} observations; {total / secs if secs else 0:,.0f} rows/s).")
 
 if __name__ == "__main__":
     run()
@@ -1,12 +1,111 @@
 # scripts/neo4j_common.py
-from neo4j import GraphDatabase
-import os
+from collections import defaultdict, deque
+from neo4j import AsyncGraphDatabase, GraphDatabase, RoutingControl
+from neo4j.exceptions import DriverError
+import os, threading, time
+import requests
 
-def get_driver():
-    uri  = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-    user = os.getenv("NEO4J_USER", "neo4j")
-    pwd  = os.getenv("NEO4J_PASSWORD", "testpass")  # set to your real password if different
-    return GraphDatabase.driver(uri, auth=(user, pwd))
+def pool_config():
+    """Driver pool settings shared by the loaders and the API (src/app.py)."""
+    return {
+        "max_connection_pool_size": int(os.getenv("NEO4J_POOL_SIZE", "50")),
+        # seconds to wait for a free pooled connection before failing the query
+        "connection_acquisition_timeout": float(os.getenv("NEO4J_POOL_TIMEOUT", "10")),
+    }
+
+def _target(uri=None, user=None, pwd=None):
+    uri  = uri or os.getenv("NEO4J_URI", "bolt://localhost:7687")
+    user = user or os.getenv("NEO4J_USER", "neo4j")
+    pwd  = pwd or os.getenv("NEO4J_PASSWORD", "testpass")  # set to your real password if different
+    return uri, (user, pwd)
+
+def get_driver(uri=None, user=None, pwd=None, **config):
+    uri, auth = _target(uri, user, pwd)
+    return GraphDatabase.driver(uri, auth=auth, **{**pool_config(), **config})
+
+def get_async_driver(uri=None, user=None, pwd=None, **config):
+    """Pooled asyncio driver; one per process, safe to share across concurrent requests."""
+    uri, auth = _target(uri, user, pwd)
+    return AsyncGraphDatabase.driver(uri, auth=auth, **{**pool_config(), **config})
+
+class QueryStats:
+    """Per-query latency: call/error counts, mean, and p50/p95/max over the last `window` calls."""
+
+    def __init__(self, window=1024):
+        self._lock = threading.Lock()
+        self._recent = defaultdict(lambda: deque(maxlen=window))
+        self._calls = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._total = defaultdict(float)
+
+    def record(self, name, seconds, ok=True):
+        with self._lock:
+            self._recent[name].append(seconds)
+            self._calls[name] += 1
+            self._total[name] += seconds
+            if not ok:
+                self._errors[name] += 1
+
+    def snapshot(self):
+        out = {}
+        with self._lock:
+            for name, recent in self._recent.items():
+                lat = sorted(recent)
+                out[name] = {
+                    "calls": self._calls[name], "errors": self._errors[name],
+                    "mean_ms": 1000 * self._total[name] / self._calls[name],
+                    "p50_ms": 1000 * lat[len(lat) // 2],
+                    "p95_ms": 1000 * lat[min(len(lat) - 1, int(len(lat) * 0.95))],
+                    "max_ms": 1000 * lat[-1],
+                }
+        return out
+
+query_stats = QueryStats()
+
+async def read_query(driver, name, query, database=None, **params):
+    """Run a read query on a pooled async driver, timed under `name`. Returns the records as dicts."""
+    t0, ok = time.perf_counter(), False
+    try:
+        records, _, _ = await driver.execute_query(query, params, routing_=RoutingControl.READ, database_=database)
+        ok = True
+        return [r.data() for r in records]
+    finally:
+        query_stats.record(name, time.perf_counter() - t0, ok)
+
+class KgReader:
+    """
+    What the API holds as its `kg` component: a pooled async driver whose read() is timed in
+    query_stats and raises ConnectionError on driver failures (server unreachable, no pooled
+    connection within NEO4J_POOL_TIMEOUT), so callers never import neo4j themselves.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def read(self, name, query, database=None, **params):
+        try:
+            return await read_query(self.driver, name, query, database, **params)
+        except DriverError as e:
+            raise ConnectionError(str(e)) from e
+
+    async def close(self):
+        await self.driver.close()
+
+def notify_api_kg_changed():
+    """
+    Tell a running API (API_BASE_URL) to drop its cached graph lookups after a load.
+      - authenticates with CACHE_ADMIN_TOKEN (the same value the API is started with)
+      - reaches one worker only; the others catch up within the API's DX_CACHE_TTL
+    """
+    api = os.getenv("API_BASE_URL")
+    if not api:
+        return
+    headers = {"X-Admin-Token": os.getenv("CACHE_ADMIN_TOKEN", "")}
+    try:
+        requests.post(f"{api.rstrip('/')}/cache/dx_by_loinc/invalidate", headers=headers,
+                      timeout=5).raise_for_status()
+    except requests.RequestException as e:
+        print(f"[WARN] Could not invalidate API dx cache: {e}")
 
 # --- Constraints for the MIMIC-IV ED demo graph ---
 def ensure_mimic_constraints(session):
@@ -22,6 +121,11 @@ def ensure_mimic_constraints(session):
     CREATE CONSTRAINT mimic_complaint IF NOT EXISTS
     FOR (c:Complaint) REQUIRE c.text IS UNIQUE
     """)
+    # Vital is MERGEd on (stay_id, charttime); without this each batch scans every Vital
+    session.run("""
+    CREATE INDEX mimic_vital IF NOT EXISTS
+    FOR (v:Vital) ON (v.stay_id, v.charttime)
+    """)
 
 # --- Example constraints for a Synthea graph (keep if you use Synthea) ---
 def ensure_synthea_constraints(session):
@@ -37,3 +141,8 @@ def ensure_synthea_constraints(session):
     CREATE CONSTRAINT synthea_obs IF NOT EXISTS
     FOR (o:Observation) REQUIRE o.id IS UNIQUE
     """)
+    # one watermark per source bundle for incremental loads
+    session.run("""
+    CREATE CONSTRAINT synthea_loaded_file IF NOT EXISTS
+    FOR (f:LoadedFile) REQUIRE f.path IS UNIQUE
+    """)
@@ -0,0 +1,112 @@
+# src/admission_model.py
+import math
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+
+def _sigmoid(z):
+    """Logistic 1 / (1 + e^-z) on an array; exp overflow for very negative z just gives 0."""
+    with np.errstate(over="ignore"):
+        return 1.0 / (1.0 + np.exp(-z))
+
+
+def _sigmoid_one(z: float) -> float:
+    """Scalar form for predict_one: plain math, no errstate/ufunc overhead, no overflow on either side."""
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1.0 + e)
+
+
+def _linear_params(model, n_features: int):
+    """
+    (fill, coef, intercept, keep) when `model` is a plain SimpleImputer -> binary
+    LogisticRegression pipeline (train/train_lr.py), else None.
+    `keep` masks out columns the imputer dropped because they were all-NaN at fit time.
+    """
+    steps = getattr(model, "steps", None)
+    if not steps or len(steps) != 2:
+        return None
+    imputer, clf = steps[0][1], steps[1][1]
+    if type(imputer).__name__ != "SimpleImputer" or getattr(imputer, "add_indicator", False):
+        return None
+    if type(clf).__name__ != "LogisticRegression" or getattr(clf, "coef_", np.empty((2, 0))).shape[0] != 1:
+        return None
+    stats = np.asarray(imputer.statistics_, dtype=float)
+    if stats.shape[0] != n_features:
+        return None
+    keep = ~np.isnan(stats)
+    if clf.coef_.shape[1] != int(keep.sum()):
+        return None
+    coef = np.zeros(n_features)
+    coef[keep] = clf.coef_[0]
+    fill = np.where(keep, stats, 0.0)
+    return fill, coef, float(clf.intercept_[0]), keep
+
+
+class AdmissionScorer:
+    """
+    Serving-side wrapper around the admission model + feature_list.json.
+      - feature name -> column index map built once at load
+      - rows are aligned straight into preallocated NumPy arrays (no per-request DataFrame)
+      - for the SimpleImputer + LogisticRegression pipeline, probabilities are computed
+        in place (impute, dot, sigmoid); anything else goes through predict_proba
+    """
+
+    def __init__(self, model, feat_names: List[str]):
+        self.model = model
+        self.feat_names = list(feat_names)
+        self.feat_index: Dict[str, int] = {k: j for j, k in enumerate(self.feat_names)}
+        self._nan_row = np.full(len(self.feat_names), np.nan)
+        self._linear = _linear_params(model, len(self.feat_names))
+        if self._linear is not None and not self._linear_matches_model():
+            self._linear = None
+
+    @property
+    def fast_path(self) -> bool:
+        return self._linear is not None
+
+    def _linear_matches_model(self) -> bool:
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(4, len(self.feat_names))) * 50
+        X[1, ::2] = np.nan
+        ref = self.model.predict_proba(pd.DataFrame(X, columns=self.feat_names))[:, 1]
+        return bool(np.allclose(self.predict_proba(X.copy()), ref, rtol=1e-9, atol=1e-12))
+
+    def align(self, feats: Dict[str, float]) -> np.ndarray:
+        """One feature dict -> 1-D row in feat_names order; unknown keys ignored, missing = NaN."""
+        x = self._nan_row.copy()
+        idx = self.feat_index
+        for k, v in feats.items():
+            j = idx.get(k)
+            if j is not None:
+                x[j] = v
+        return x
+
+    def align_many(self, rows: List[Dict[str, float]]) -> np.ndarray:
+        X = np.full((len(rows), len(self.feat_names)), np.nan)
+        idx = self.feat_index
+        for i, feats in enumerate(rows):
+            for k, v in feats.items():
+                j = idx.get(k)
+                if j is not None:
+                    X[i, j] = v
+        return X
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """P(admit) per row of a 2-D float matrix. May overwrite NaNs in X."""
+        if self._linear is None:
+            return self.model.predict_proba(pd.DataFrame(X, columns=self.feat_names))[:, 1]
+        fill, coef, intercept, _ = self._linear
+        np.copyto(X, fill, where=np.isnan(X))
+        return _sigmoid(X @ coef + intercept)
+
+    def predict_one(self, x: np.ndarray) -> float:
+        """Single aligned row; avoids matrix overhead on the linear fast path."""
+        if self._linear is None:
+            return float(self.predict_proba(x[None, :])[0])
+        fill, coef, intercept, _ = self._linear
+        np.copyto(x, fill, where=np.isnan(x))
+        return _sigmoid_one(float(x @ coef) + intercept)
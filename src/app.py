@@ -1,23 +1,23 @@
 ﻿# ---- top of src/app.py ----
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
 from pathlib import Path
+from contextlib import asynccontextmanager
+import asyncio
+import hmac
 
-app = FastAPI(title="Clinical KG + NLP demo")
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
-from fastapi import FastAPI
 from pydantic import BaseModel, RootModel
-from py2neo import Graph
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
 import re
 
+from src.lazy import LazyComponent, warm_up
+
 # add new to Connect to a synthetic FHIR server
 
-import os, json, requests
-from typing import Any, Dict, Optional
-from fastapi import HTTPException
+import os, json
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from fastapi.responses import JSONResponse
 
 from dotenv import load_dotenv
 
@@ -34,19 +34,76 @@ def fhir_params(params: Dict[str, str]) -> Dict[str, str]:
     # HAPI accepts _count, code, etc.
     return {k: v for k, v in params.items() if v is not None}
 
-app = FastAPI(title="Clinical KG + NLP demo")
+# Heavy dependencies are LazyComponents: loaded on first use, or ahead of time by the
+# lifespan warm-up task (APP_WARMUP=0 disables it). Startup itself never waits on them.
+COMPONENTS: Dict[str, LazyComponent] = {}
+
+def component(name: str):
+    def register(loader):
+        COMPONENTS[name] = LazyComponent(name, loader)
+        return COMPONENTS[name]
+    return register
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm = None
+    if os.getenv("APP_WARMUP", "1") == "1":
+        warm = asyncio.create_task(warm_up(COMPONENTS.values()))
+    yield
+    if warm is not None and not warm.done():
+        warm.cancel()
+    if kg.ready and kg.get() is not None:
+        await kg.get().close()
+    if fhir_client.ready and fhir_client.get() is not None:
+        await fhir_client.get().aclose()
+    # journal file handle, then the segment mmaps
+    fhir_index_log.close()
+    if fhir_storage.ready:
+        fhir_storage.get().close()
+
+app = FastAPI(title="Clinical KG + NLP demo", lifespan=lifespan)
+
+@app.get("/ready")
+def ready():
+    """
+    Per-component warm-up state; 503 until every component has loaded or failed.
+    A failed component counts as settled (it is retried on first use) and is listed under `failed`.
+    """
+    comps = {name: c.status() for name, c in COMPONENTS.items()}
+    failed = sorted(name for name, c in comps.items() if not c["ready"] and c["error"])
+    settled = all(c["ready"] or c["error"] for c in comps.values())
+    return JSONResponse({"ready": settled, "failed": failed, "components": comps},
+                        status_code=200 if settled else 503)
 
 # replaces: graph = Graph("bolt://localhost:7687", auth=("neo4j","testpass"))
 NEO4J_URI = os.getenv("NEO4J_URI")  # e.g., bolt://host.docker.internal:7687
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASS = os.getenv("NEO4J_PASS", "testpass")
-graph = Graph(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS)) if NEO4J_URI else None
-
-
-train_text = ["polyuria high glucose", "low hemoglobin", "normal check"]
-train_y    = ["diabetes","anemia","other"]
-vec = TfidfVectorizer().fit(train_text)
-clf = LogisticRegression(max_iter=500).fit(vec.transform(train_text), train_y)
+NEO4J_DB = os.getenv("NEO4J_DB")
+# driver-side retry budget per query; keep it short on the request path (driver default is 30s)
+NEO4J_RETRY_TIME = float(os.getenv("NEO4J_RETRY_TIME", "2"))
+
+# pooled async driver (NEO4J_POOL_SIZE / NEO4J_POOL_TIMEOUT): graph endpoints await queries
+# instead of parking a worker thread on one shared py2neo connection; neo4j is imported on load
+@component("kg")
+def kg():
+    if not NEO4J_URI:
+        return None
+    from scripts.neo4j_common import KgReader, get_async_driver
+    return KgReader(get_async_driver(NEO4J_URI, NEO4J_USER, NEO4J_PASS,
+                                     max_transaction_retry_time=NEO4J_RETRY_TIME))
+
+
+@component("nlp")
+def note_classifier():
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+
+    train_text = ["polyuria high glucose", "low hemoglobin", "normal check"]
+    train_y    = ["diabetes","anemia","other"]
+    vec = TfidfVectorizer().fit(train_text)
+    clf = LogisticRegression(max_iter=500).fit(vec.transform(train_text), train_y)
+    return vec, clf
 
 # end New
 
@@ -66,58 +123,158 @@ class FHIRResource(RootModel[Dict[str, Any]]):
 
 # --- end NEW ---
 
+from src.ttl_cache import TTLCache
+
+# Lab->Diagnosis answers change only when the KG is reloaded (src/kg_load.py, scripts/load_neo4j.py),
+# which call POST /cache/dx_by_loinc/invalidate. The cache lives in each process: under several uvicorn
+# workers that POST clears only the worker that receives it, so DX_CACHE_TTL is the staleness bound
+# across workers (and if the hook is missed). Lower it when reloads must show up sooner.
+dx_cache = TTLCache(maxsize=int(os.getenv("DX_CACHE_SIZE", "4096")),
+                    ttl=float(os.getenv("DX_CACHE_TTL", "600")))
+
 @app.get("/dx_by_loinc/{loinc}")
-def dx_by_loinc(loinc: str):
+async def dx_by_loinc(loinc: str):
+    hit, dx = dx_cache.get(loinc)
+    if hit:
+        return {"loinc": loinc, "dx_codes": dx}
+
+    reader = await kg.aget()
     # Guard if Neo4j isn’t configured
-    if graph is None:
+    if reader is None:
         raise HTTPException(status_code=503, detail="Neo4j not configured (set NEO4J_URI).")
     
     # Original query
     q = "MATCH (:Lab {loinc:$loinc})-[]->(d:Diagnosis) RETURN collect(d.code) AS dx"
-    res = graph.run(q, loinc=loinc).data()
+    try:
+        res = await reader.read("dx_by_loinc", q, database=NEO4J_DB, loinc=loinc)
+    except ConnectionError as e:  # server unreachable, or no pooled connection within NEO4J_POOL_TIMEOUT
+        raise HTTPException(status_code=503, detail=f"Neo4j unavailable: {e}")
+    dx = res[0]["dx"] if res else []
+    dx_cache.set(loinc, dx)
     
-    return {"loinc": loinc, "dx_codes": (res[0]["dx"] if res else [])}
+    return {"loinc": loinc, "dx_codes": dx}
+
+@app.get("/kg/metrics")
+def kg_metrics():
+    """Per-query Neo4j latency plus the driver pool settings."""
+    from scripts.neo4j_common import pool_config, query_stats
+    return {"pool": pool_config(), "queries": query_stats.snapshot()}
+
+@app.get("/cache/dx_by_loinc")
+def dx_cache_stats():
+    return dx_cache.stats()
+
+@app.post("/cache/dx_by_loinc/invalidate")
+def dx_cache_invalidate(loinc: Optional[str] = None, x_admin_token: Optional[str] = Header(None)):
+    """
+    Drop one LOINC (?loinc=...) or the whole cache of this worker; called after KG loads.
+      - needs header X-Admin-Token matching CACHE_ADMIN_TOKEN; disabled (403) while that is unset
+    """
+    token = os.getenv("CACHE_ADMIN_TOKEN", "")
+    if not token:
+        raise HTTPException(status_code=403, detail="Cache invalidation disabled (set CACHE_ADMIN_TOKEN).")
+    if not hmac.compare_digest((x_admin_token or "").encode(), token.encode()):
+        raise HTTPException(status_code=401, detail="Missing or wrong X-Admin-Token.")
+    return {"invalidated": dx_cache.invalidate(loinc)}
 
 
 @app.post("/classify_note")
 def classify(note: NoteIn):
+    vec, clf = note_classifier.get()
     X = vec.transform([clean_text(note.text)])
     yhat = clf.predict(X)[0]
     return {"label": yhat}
 
-from fastapi.responses import JSONResponse
-from pathlib import Path
-import json
 
+from src.fhir_index import FhirIndex, FhirIndexLog
+from src.fhir_storage import open_storage
+from fastapi.responses import Response, StreamingResponse
+from fastapi import Request
+import zlib
 
 # FHIR local store
 FHIR_DIR   = BASE_DIR / "out" / "fhir"
 FHIR_INDEX = FHIR_DIR / "index.json"
 
-def load_fhir_index():
-    if FHIR_INDEX.exists():
-        with open(FHIR_INDEX, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
-
-fhir_index_cache = load_fhir_index()
+# resource bodies: one file per id (default) or packed segments (FHIR_STORAGE=segments)
+@component("fhir_storage")
+def fhir_storage():
+    return open_storage(FHIR_DIR)
+
+# snapshot + append-only journal; POSTs append, a background thread compacts
+fhir_index_log = FhirIndexLog(
+    FHIR_INDEX,
+    compact_every=int(os.getenv("FHIR_INDEX_COMPACT_EVERY", "10000")),
+    fsync=os.getenv("FHIR_INDEX_FSYNC", "0") == "1",
+)
+
+@component("fhir_index")
+def fhir_index() -> FhirIndex:
+    return fhir_index_log.load()
+
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+def _ndjson_stream(entries, gzip_out: bool):
+    """Read matching resources one at a time and yield ~64 KB NDJSON (optionally gzip) chunks."""
+    storage = fhir_storage.get()
+    comp = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip_out else None  # wbits=31 -> gzip framing
+    buf, size = [], 0
+    for e in entries:
+        body = storage.get(e["id"])
+        if body is None:
+            continue
+        if b"\n" in body:
+            # pretty-printed file storage; NDJSON needs one resource per line
+            body = json.dumps(json.loads(body), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        buf.append(body + b"\n")
+        size += len(body) + 1
+        if size >= EXPORT_FLUSH_BYTES:
+            chunk = b"".join(buf)
+            buf, size = [], 0
+            chunk = comp.compress(chunk) if comp else chunk
+            if chunk:
+                yield chunk
+    chunk = b"".join(buf)
+    if comp:
+        chunk = comp.compress(chunk) + comp.flush()
+    if chunk:
+        yield chunk
+
+# registered before /fhir/observation/{obs_id} so "$export" isn't taken for an id
+@app.get("/fhir/observation/$export")
+def fhir_observation_export(request: Request, loinc: Optional[str] = None, patient_id: Optional[str] = None,
+                            date_from: Optional[str] = None, date_to: Optional[str] = None):
+    """
+    Bulk Data style NDJSON export of every matching Observation in a single response.
+    Resources are streamed lazily from storage, so server memory stays flat;
+    the body is gzip-encoded when the client sends Accept-Encoding: gzip.
+    """
+    entries = fhir_index.get().iter_query(loinc=loinc, patient_id=patient_id,
+                                         date_from=date_from, date_to=date_to)
+    gzip_out = "gzip" in request.headers.get("accept-encoding", "").lower()
+    headers = {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"} if gzip_out else {}
+    return StreamingResponse(_ndjson_stream(entries, gzip_out), media_type="application/fhir+ndjson",
+                             headers=headers)
 
 @app.get("/fhir/observation/{obs_id}")
 def fhir_observation(obs_id: str):
-    path = FHIR_DIR / f"{obs_id}.json"
-    if not path.exists():
+    body = fhir_storage.get().get(obs_id)
+    if body is None:
         return JSONResponse({"detail": "Observation not found"}, status_code=404)
-    with open(path, "r", encoding="utf-8") as f:
-        return JSONResponse(json.load(f))
+    # stored bytes are already JSON; no parse/re-serialize round trip
+    return Response(content=body, media_type="application/json")
 
 @app.get("/fhir/observation/by_loinc/{loinc}")
-def fhir_by_loinc(loinc: str, limit: int = 10):
-    matches = [x for x in fhir_index_cache if x.get("loinc") == loinc][:max(1, min(limit, 100))]
+def fhir_by_loinc(loinc: str, limit: int = 10, patient_id: Optional[str] = None,
+                  date_from: Optional[str] = None, date_to: Optional[str] = None):
+    # indexed lookup; date_from/date_to are inclusive 'YYYY-MM-DD' bounds
+    matches = fhir_index.get().query(loinc=loinc, patient_id=patient_id, date_from=date_from,
+                                     date_to=date_to, limit=max(1, min(limit, 100)))
     # return just ids & minimal info to keep payload small
     return JSONResponse({"loinc": loinc, "count": len(matches), "observations": [{"id": m["id"], "date": m["date"], "patient_id": m["patient_id"]} for m in matches]})
 
 from fastapi import Body
-from fastapi import HTTPException, status
+from fastapi import status
 from datetime import datetime
 
 def _is_iso_datetime(s: str) -> bool:
@@ -185,17 +342,14 @@ def create_fhir_observation(obs: dict = Body(...)):
     """
     Minimal validator + saver:
     - Checks core FHIR Observation fields
-    - Writes to out/fhir/<id>.json
+    - Writes to the configured storage backend (out/fhir/<id>.json by default)
     - Updates in-memory index so it's immediately discoverable
     """
     _validate_observation(obs)
 
     # Save JSON
     obs_id = obs["id"]
-    out_path = FHIR_DIR / f"{obs_id}.json"
-    FHIR_DIR.mkdir(parents=True, exist_ok=True)
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(obs, f, ensure_ascii=False, indent=2)
+    out_path = fhir_storage.get().put(obs_id, obs)
 
     # Update index in memory and on disk (best-effort)
     loinc_code = obs["code"]["coding"][0]["code"]
@@ -206,61 +360,133 @@ def create_fhir_observation(obs: dict = Body(...)):
     # patient id from subject.reference
     patient_id = obs["subject"]["reference"].split("/", 1)[-1]
 
-    # avoid duplicates in cache
-    global fhir_index_cache
-    fhir_index_cache = [x for x in fhir_index_cache if x.get("id") != obs_id]
-    fhir_index_cache.append({
+    # journal + in-memory upsert (replaces any previous entry with the same id)
+    fhir_index.get()  # index must be loaded before we append to it
+    fhir_index_log.upsert({
         "id": obs_id,
         "loinc": loinc_code,
         "patient_id": patient_id,
         "date": date_only,
-        "path": str(out_path),
+        "path": out_path,
     })
-    # persist the index
-    with open(FHIR_INDEX, "w", encoding="utf-8") as f:
-        json.dump(fhir_index_cache, f, ensure_ascii=False, indent=2)
 
-    return {"detail": "created", "id": obs_id, "path": str(out_path)}
-
-# --- NEW: query a remote synthetic FHIR server by LOINC ---
-@app.get("/remote/fhir/observations/by_loinc/{loinc}")
-def remote_fhir_by_loinc(loinc: str, limit: int = 10):
-    base = fhir_base()
-    url = f"{base}/Observation"
+    return {"detail": "created", "id": obs_id, "path": out_path}
+
+if TYPE_CHECKING:
+    from src.fhir_client import FhirClient
+
+# one keep-alive, pooled client for every remote FHIR call (FHIR_MAX_CONNECTIONS, FHIR_HTTP2, FHIR_RETRIES, ...);
+# httpx is imported on load, so handlers catch `client.errors` rather than httpx/FhirUnavailable by name
+@component("fhir_client")
+def fhir_client():
+    if not os.getenv("FHIR_BASE_URL", "").strip():
+        return None
+    from src.fhir_client import FhirClient
+    return FhirClient.from_env(fhir_base())
+
+async def _remote_fhir() -> "FhirClient":
+    client = await fhir_client.aget()
+    if client is None:
+        raise HTTPException(status_code=503, detail="Remote FHIR not configured (set FHIR_BASE_URL).")
+    return client
+
+@app.get("/remote/fhir/client")
+def remote_fhir_client_stats():
+    """Request/retry counters and circuit-breaker state of the shared FHIR client."""
+    client = fhir_client.get() if fhir_client.ready else None
+    return client.stats() if client is not None else {"configured": bool(os.getenv("FHIR_BASE_URL"))}
+
+# row/time budgets for one remote search call (all pages together)
+REMOTE_MAX_ROWS = int(os.getenv("REMOTE_FHIR_MAX_ROWS", "100000"))
+REMOTE_TIME_BUDGET = float(os.getenv("REMOTE_FHIR_TIME_BUDGET", "60"))
+
+def _remote_search(client: "FhirClient", loinc: str, page_size: int, max_rows: int, time_budget: float):
     params = fhir_params({
         "code": f"http://loinc.org|{loinc}",
-        "_count": str(max(1, min(limit, 100)))
+        "_count": str(max(1, min(page_size, 100)))
     })
-    try:
-        r = requests.get(url, params=params, timeout=15, headers={"Accept": "application/fhir+json"})
-        r.raise_for_status()
-        bundle = r.json()
-    except requests.RequestException as e:
-        raise HTTPException(status_code=502, detail=f"FHIR GET failed: {e}")
+    return client.search("/Observation", params=params, max_rows=max(1, min(max_rows, REMOTE_MAX_ROWS)),
+                         time_budget=max(0.1, min(time_budget, REMOTE_TIME_BUDGET)))
 
-    entries = bundle.get("entry", []) or []
+def _remote_error(op: str, e: Exception) -> HTTPException:
+    code = getattr(e, "status_code", 502)  # FhirUnavailable carries 503
+    return HTTPException(status_code=code, detail=f"FHIR {op} failed: {e}")
+
+# --- NEW: query a remote synthetic FHIR server by LOINC ---
+@app.get("/remote/fhir/observations/by_loinc/{loinc}")
+async def remote_fhir_by_loinc(loinc: str, limit: int = 10):
+    client = await _remote_fhir()
+    base = client.base_url
+    # follows next links, so limit > 100 spans several pages
+    search = _remote_search(client, loinc, page_size=limit, max_rows=limit, time_budget=REMOTE_TIME_BUDGET)
     out = []
-    for e in entries[:limit]:
-        res = e.get("resource", {}) or {}
-        out.append({
-            "id": res.get("id"),
-            "status": res.get("status"),
-            "effectiveDateTime": res.get("effectiveDateTime") or res.get("issued"),
-            "valueQuantity": res.get("valueQuantity"),
-            "subject": res.get("subject"),
-            "code": res.get("code"),
-        })
-    return {"server": base, "loinc": loinc, "count": len(out), "observations": out}
+    try:
+        async for res in search:
+            out.append({
+                "id": res.get("id"),
+                "status": res.get("status"),
+                "effectiveDateTime": res.get("effectiveDateTime") or res.get("issued"),
+                "valueQuantity": res.get("valueQuantity"),
+                "subject": res.get("subject"),
+                "code": res.get("code"),
+            })
+    except client.errors as e:
+        raise _remote_error("GET", e)
+    return {"server": base, "loinc": loinc, "count": len(out), "pages": search.pages,
+            "truncated": search.truncated, "observations": out}
+
+async def _remote_ndjson(search, pages, first):
+    """NDJSON in ~64 KB chunks; a budget cut or mid-stream upstream failure ends with an OperationOutcome line."""
+    buf, size = [], 0
+    outcome = None
+    try:
+        if first is not None:
+            buf.append(json.dumps(first, separators=(",", ":")) + "\n")
+        async for res in pages:
+            line = json.dumps(res, separators=(",", ":")) + "\n"
+            buf.append(line)
+            size += len(line)
+            if size >= EXPORT_FLUSH_BYTES:
+                yield "".join(buf)
+                buf, size = [], 0
+    except search.client.errors as e:
+        outcome = f"upstream failed after {search.rows} rows: {e}"
+    if outcome is None and search.truncated:
+        outcome = f"stopped at the {search.truncated} budget after {search.rows} rows, {search.pages} pages"
+    if outcome:
+        buf.append(json.dumps({"resourceType": "OperationOutcome", "issue": [
+            {"severity": "warning", "code": "incomplete", "diagnostics": outcome}]}, separators=(",", ":")) + "\n")
+    if buf:
+        yield "".join(buf)
+
+@app.get("/remote/fhir/observations/by_loinc/{loinc}/ndjson")
+async def remote_fhir_by_loinc_ndjson(loinc: str, max_rows: int = 10000, time_budget: float = 30.0,
+                                      page_size: int = 100):
+    """
+    Stream every matching remote Observation as NDJSON, paging through the server's next links
+    (the following page is fetched while the current one is written out).
+    """
+    client = await _remote_fhir()
+    search = _remote_search(client, loinc, page_size=page_size, max_rows=max_rows, time_budget=time_budget)
+    pages = search.__aiter__()
+    # pull the first resource up front so a dead server is a 502/503, not an empty 200
+    try:
+        first = await pages.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except client.errors as e:
+        raise _remote_error("GET", e)
+    return StreamingResponse(_remote_ndjson(search, pages, first), media_type="application/fhir+ndjson")
 
 # --- NEW: submit (optionally de-identified) Observation to remote FHIR server ---
 @app.post("/remote/fhir/submit_observation")
-def remote_fhir_submit_observation(payload: FHIRResource, deid: bool = True):
+async def remote_fhir_submit_observation(payload: FHIRResource, deid: bool = True):
     """
     Submit an Observation to the configured FHIR server.
     Set ?deid=false to send as-is (demo only).
     """
-    base = fhir_base()
-    url = f"{base}/Observation"
+    client = await _remote_fhir()
+    base = client.base_url
     obs = payload.root
 
 
@@ -273,16 +499,109 @@ def remote_fhir_submit_observation(payload: FHIRResource, deid: bool = True):
         raise HTTPException(status_code=400, detail="resourceType must be 'Observation'")
 
     try:
-        r = requests.post(url, json=obs, headers={"Content-Type": "application/fhir+json"}, timeout=15)
-        r.raise_for_status()
-        outcome = r.json()
-    except requests.RequestException as e:
-        raise HTTPException(status_code=502, detail=f"FHIR POST failed: {e}")
+        outcome = await client.post_json("/Observation", obs)
+    except client.errors as e:
+        raise _remote_error("POST", e)
 
     return {"server": base, "status": "submitted", "id": outcome.get("id"), "outcome": outcome}
 
+REMOTE_SUBMIT_MAX = int(os.getenv("REMOTE_FHIR_SUBMIT_MAX", "50000"))
+REMOTE_BUNDLE_MAX = int(os.getenv("REMOTE_FHIR_BUNDLE_MAX", "500"))
+REMOTE_SUBMIT_CONCURRENCY = int(os.getenv("REMOTE_FHIR_SUBMIT_CONCURRENCY", "4"))
+
+def _parse_observations(body: bytes, content_type: str) -> List[Any]:
+    """JSON array, or NDJSON (one resource per line) when the content type says so."""
+    if "ndjson" in content_type:
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    data = json.loads(body)
+    if not isinstance(data, list):
+        raise ValueError("expected a JSON array of Observations (or NDJSON)")
+    return data
+
+def _deid_all(items: List[dict], idx: List[int], outcomes: Dict[int, dict]) -> List[dict]:
+    """Vectorized de-id; on a bad entry, redo one by one so only that entry fails."""
+    try:
+        return deid_observations([items[i] for i in idx])
+    except Exception:
+        pass
+    kept = []
+    for i in list(idx):
+        try:
+            kept.append(deid_observation(items[i]))
+        except Exception as e:
+            outcomes[i] = {"index": i, "status": "400", "error": f"de-id failed: {e}"}
+            idx.remove(i)
+    return kept
+
+def _entry_outcome(index: int, entry: dict) -> dict:
+    resp = entry.get("response") or {}
+    status_line = str(resp.get("status", ""))
+    out = {"index": index, "status": status_line.split(" ", 1)[0] or None}
+    if resp.get("location"):
+        out["location"] = resp["location"]
+        out["id"] = resp["location"].split("/")[1] if "/" in resp["location"] else None
+    if not status_line.startswith("2"):
+        issues = (resp.get("outcome") or {}).get("issue") or [{}]
+        out["error"] = issues[0].get("diagnostics") or status_line
+    return out
+
+async def _send_bundle(client: "FhirClient", sem: asyncio.Semaphore, bundle_type: str, idx: List[int],
+                       resources: List[dict]) -> List[dict]:
+    bundle = {"resourceType": "Bundle", "type": bundle_type, "entry": [
+        {"resource": r, "request": {"method": "POST", "url": "Observation"}} for r in resources]}
+    async with sem:
+        try:
+            reply = await client.post_json("", bundle)
+        except client.errors as e:
+            # batch: the request itself failed; transaction: the server rolled everything back
+            resp = getattr(e, "response", None)  # set on upstream HTTP status errors
+            code = resp.status_code if resp is not None else 503
+            return [{"index": i, "status": str(code), "error": str(e)} for i in idx]
+    entries = reply.get("entry") or []
+    return [_entry_outcome(i, entries[k] if k < len(entries) else {}) for k, i in enumerate(idx)]
+
+@app.post("/remote/fhir/submit_observations")
+async def remote_fhir_submit_observations(request: Request, deid: bool = True, bundle_type: str = "batch",
+                                          bundle_size: int = 100):
+    """
+    Bulk submit: JSON array or NDJSON body of Observations, sent as `batch` (per-entry
+    success) or `transaction` (all-or-nothing per Bundle) Bundles of `bundle_size`, a few
+    Bundles in flight at once (REMOTE_FHIR_SUBMIT_CONCURRENCY). Returns one outcome per input entry.
+    """
+    if bundle_type not in ("batch", "transaction"):
+        raise HTTPException(status_code=400, detail="bundle_type must be 'batch' or 'transaction'")
+    client = await _remote_fhir()
+    try:
+        items = _parse_observations(await request.body(), request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Bad request body: {e}")
+    if len(items) > REMOTE_SUBMIT_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {REMOTE_SUBMIT_MAX} observations per call.")
+
+    outcomes: Dict[int, dict] = {}
+    idx = []
+    for i, obs in enumerate(items):
+        if isinstance(obs, dict) and obs.get("resourceType") == "Observation":
+            idx.append(i)
+        else:
+            outcomes[i] = {"index": i, "status": "400", "error": "resourceType must be 'Observation'"}
+    resources = _deid_all(items, idx, outcomes) if deid else [items[i] for i in idx]
+
+    size = max(1, min(bundle_size, REMOTE_BUNDLE_MAX))
+    sem = asyncio.Semaphore(max(1, REMOTE_SUBMIT_CONCURRENCY))
+    jobs = [_send_bundle(client, sem, bundle_type, idx[k:k + size], resources[k:k + size])
+            for k in range(0, len(idx), size)]
+    for results in await asyncio.gather(*jobs):
+        for o in results:
+            outcomes[o["index"]] = o
+
+    ordered = [outcomes[i] for i in range(len(items))]
+    ok = sum(1 for o in ordered if str(o.get("status", "")).startswith("2"))
+    return {"server": client.base_url, "bundle_type": bundle_type, "bundles": len(jobs),
+            "submitted": ok, "failed": len(ordered) - ok, "outcomes": ordered}
 
-from src.deid import deid_observation
+
+from src.deid import deid_observation, deid_observations
 
 
 @app.post("/deid/observation")
@@ -297,108 +616,147 @@ def deid_observation_api(obs: dict):
 # ====== ML serving: admission model ======
 from pydantic import BaseModel, Field
 from typing import Dict, Optional, List
-import joblib, json, numpy as np, pandas as pd
+import numpy as np
+
+from src.microbatch import MicroBatcher
 
 MODEL_PATH = BASE_DIR / "models" / "admit_lr.joblib"
 FEAT_PATH  = BASE_DIR / "models" / "feature_list.json"
 FEATURES_PARQUET = BASE_DIR / "data" / "processed" / "features.parquet"
 
-if not (MODEL_PATH.exists() and FEAT_PATH.exists()):
-    print("[WARN] ML artifacts not found; /predict/admission will 503 until you save models.")
-    _model = None
-    _feat_names: List[str] = []
-else:
-    _model = joblib.load(MODEL_PATH)
-    _feat_names = json.loads(FEAT_PATH.read_text())
+# Largest batch /predict/admission/batch accepts (override with PREDICT_MAX_BATCH)
+PREDICT_MAX_BATCH = int(os.getenv("PREDICT_MAX_BATCH", "5000"))
+
+# concurrent /predict/admission calls are coalesced into one model call per window;
+# PREDICT_BATCH_WINDOW_MS=0 scores each request on its own. Unset: off when the linear fast
+# path scores a row inline in microseconds (a wait would only add latency), 2 ms otherwise
+PREDICT_BATCH_WINDOW_MS = os.getenv("PREDICT_BATCH_WINDOW_MS", "").strip()
+
+@component("admission_model")
+def admission_model():
+    """(scorer, batcher) or None when the artifacts haven't been trained yet."""
+    if not (MODEL_PATH.exists() and FEAT_PATH.exists()):
+        print("[WARN] ML artifacts not found; /predict/admission will 503 until you save models.")
+        return None
+    import joblib
+    from src.admission_model import AdmissionScorer
+
+    # precomputed feature->column map + in-place imputer/coef scoring for the LR pipeline
+    scorer = AdmissionScorer(joblib.load(MODEL_PATH), json.loads(FEAT_PATH.read_text()))
+    window_ms = float(PREDICT_BATCH_WINDOW_MS) if PREDICT_BATCH_WINDOW_MS else (0.0 if scorer.fast_path else 2.0)
+    batcher = None
+    if window_ms > 0:
+        batcher = MicroBatcher(scorer.predict_proba,
+                               max_batch=int(os.getenv("PREDICT_BATCH_ROWS", "64")),
+                               max_wait_ms=window_ms,
+                               offload=not scorer.fast_path)
+    return scorer, batcher
+
+@component("features")
+def feature_store():
+    # features table held in memory, aligned to the model's columns; reloads when the file changes
+    loaded = admission_model.get()
+    if loaded is None:
+        return None
+    from src.feature_store import FeatureStore
+
+    store = FeatureStore(FEATURES_PARQUET, columns=loaded[0].feat_names)
+    if FEATURES_PARQUET.exists():
+        store.snapshot()
+    return store
+
+def _admission_or_503():
+    loaded = admission_model.get()
+    if loaded is None:
+        raise HTTPException(503, "Model not loaded. Train & save artifacts first.")
+    return loaded
 
 class AdmissionRequest(BaseModel):
     features: Dict[str, float] = Field(default_factory=dict)
     patient_id: Optional[int] = None
 
-def _align_features(feat_in: Dict[str, float]) -> pd.DataFrame:
-    x = {k: np.nan for k in _feat_names}
-    for k, v in feat_in.items():
-        if k in x:
-            x[k] = v
-    return pd.DataFrame([x])
-
 @app.post("/predict/admission")
-def predict_admission(payload: AdmissionRequest):
-    if _model is None or not _feat_names:
-        raise HTTPException(503, "Model not loaded. Train & save artifacts first.")
+async def predict_admission(payload: AdmissionRequest):
+    await admission_model.aget()  # loads off the event loop if warm-up hasn't got to it yet
+    scorer, batcher = _admission_or_503()
 
     if payload.features:
-        X = _align_features(payload.features)
+        X = scorer.align(payload.features)
     elif payload.patient_id is not None:
         try:
-            feat = pd.read_parquet(FEATURES_PARQUET)
+            row = (await feature_store.aget()).get_row(payload.patient_id)
         except Exception as e:
             raise HTTPException(500, f"Could not read features table: {e}")
-        row = feat.loc[feat["patient_id"] == payload.patient_id]
-        if row.empty:
+        if row is None:
             raise HTTPException(404, f"No features for patient_id={payload.patient_id}")
-        row = row.drop(columns=["patient_id"]).iloc[0].to_dict()
-        X = _align_features(row)
+        X = row.astype(float)
     else:
         raise HTTPException(400, "Provide either features or patient_id")
 
-    proba = float(_model.predict_proba(X)[:, 1][0])
+    if batcher is not None:
+        proba = await batcher.submit(X)
+    elif scorer.fast_path:
+        proba = scorer.predict_one(X)  # a few microseconds of numpy: cheaper inline than a thread hop
+    else:
+        proba = await asyncio.to_thread(scorer.predict_one, X)  # sklearn/pandas: keep it off the event loop
     label = int(proba >= 0.5)
-    return {"label": label, "probability": proba, "features_used": _feat_names}
-
-# src/app_mlflow.py
-from fastapi import FastAPI
-from pydantic import BaseModel
-import numpy as np, json
-from pathlib import Path
+    return {"label": label, "probability": proba, "features_used": scorer.feat_names}
 
-import mlflow, mlflow.pyfunc
-import joblib
 
-# --- where your curated features live ---
-FEATURES = ["2345-7", "718-7"]  # same as training
-MODELS = Path("models")
+class AdmissionBatchRequest(BaseModel):
+    instances: List[AdmissionRequest] = Field(
+        default_factory=list,
+        description="Up to PREDICT_MAX_BATCH (default 5000) rows, each with features or patient_id",
+    )
 
-# --- init model: prefer MLflow registry, fallback to joblib ---
-mlflow.set_tracking_uri("sqlite:///mlflow.db")
-mlflow.set_registry_uri("sqlite:///mlflow.db")
-
-def load_model():
-    try:
-        return mlflow.pyfunc.load_model("models:/admission_lr@champion")
-    except Exception:
-        # fallback to local artifact from training script
-        return joblib.load(MODELS / "admit_mlflow_lr.joblib")
-
-model = load_model()
-app = FastAPI(title="Mayo Demo API (MLflow)")
-
-class ObsIn(BaseModel):
-    loinc_2345_7: float | None = None
-    loinc_718_7:  float | None = None
-
-def to_feature_vec(x: ObsIn):
-    # order must match FEATURES
-    vals = {
-        "2345-7": x.loinc_2345_7 if x.loinc_2345_7 is not None else 0.0,
-        "718-7":  x.loinc_718_7  if x.loinc_718_7  is not None else 0.0,
-    }
-    return np.array([[vals[f] for f in FEATURES]])
-
-@app.get("/")
-def root():
-    return {"status": "ok", "model": "admission_lr", "features": FEATURES}
-
-@app.post("/predict/admission")
-def predict(x: ObsIn):
-    X = to_feature_vec(x)
-    try:
-        # mlflow.pyfunc returns proba via predict (if wrapped); joblib LR has predict_proba
-        if hasattr(model, "predict_proba"):
-            p = float(model.predict_proba(X)[:,1][0])
+@app.post("/predict/admission/batch")
+def predict_admission_batch(payload: AdmissionBatchRequest):
+    """
+    Score many rows with a single predict_proba call.
+    Results come back in request order; rows that can't be scored carry an "error" instead.
+    At most PREDICT_MAX_BATCH rows per call (413 otherwise).
+    """
+    scorer, _ = _admission_or_503()
+    rows = payload.instances
+    if len(rows) > PREDICT_MAX_BATCH:
+        raise HTTPException(413, f"Batch of {len(rows)} exceeds PREDICT_MAX_BATCH={PREDICT_MAX_BATCH}")
+    if not rows:
+        return {"count": 0, "results": [], "features_used": scorer.feat_names}
+
+    X = scorer.align_many([r.features for r in rows])
+    errors: Dict[int, str] = {}
+
+    by_pid = [i for i, r in enumerate(rows) if not r.features and r.patient_id is not None]
+    if by_pid:
+        try:
+            known, found = feature_store.get().get_rows([rows[i].patient_id for i in by_pid])
+        except Exception as e:
+            raise HTTPException(500, f"Could not read features table: {e}")
+        X[by_pid] = known
+        for i, ok in zip(by_pid, found):
+            if not ok:
+                errors[i] = f"No features for patient_id={rows[i].patient_id}"
+    for i, r in enumerate(rows):
+        if not r.features and r.patient_id is None:
+            errors[i] = "Provide either features or patient_id"
+
+    ok_rows = [i for i in range(len(rows)) if i not in errors]
+    proba = np.empty(len(rows))
+    if ok_rows:
+        proba[ok_rows] = scorer.predict_proba(X[ok_rows])
+
+    results = []
+    for i in range(len(rows)):
+        if i in errors:
+            results.append({"index": i, "error": errors[i]})
         else:
-            p = float(np.ravel(model.predict(X))[0])  # pyfunc fallback
-    except Exception:
-        p = float(np.ravel(model.predict(X))[0])
-    return {"admission_risk": p, "features_order": FEATURES}
-
+            results.append({"index": i, "label": int(proba[i] >= 0.5), "probability": float(proba[i])})
+    return {"count": len(results), "results": results, "features_used": scorer.feat_names}
+
+@app.get("/predict/admission/batching")
+def predict_admission_batching():
+    """Micro-batcher counters (rows scored, model calls, average batch size)."""
+    loaded = admission_model.get() if admission_model.ready else None
+    if loaded is None or loaded[1] is None:
+        return {"enabled": False}
+    return loaded[1].stats()
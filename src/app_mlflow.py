@@ -1,7 +1,7 @@
 # src/app_mlflow.py
 from pathlib import Path
-from typing import Optional, Dict, Any
-import os, traceback
+from typing import Optional, Dict, Any, List
+import asyncio, os, traceback
 
 import numpy as np
 import pandas as pd
@@ -11,6 +11,8 @@ from pydantic import BaseModel, Field
 import mlflow, mlflow.pyfunc
 import joblib
 
+from src.microbatch import MicroBatcher
+
 APP_ROOT = Path(__file__).resolve().parent.parent
 MODELS_DIR = APP_ROOT / "models"
 JOBLIB_FALLBACK = MODELS_DIR / "admit_mlflow_lr.joblib"
@@ -22,6 +24,10 @@ os.environ.setdefault("MLFLOW_REGISTRY_URI", MLFLOW_DB_URI)
 
 MODEL_URI = "models:/admission_lr@champion"
 FEATURE_ORDER = ["2345-7", "718-7"]   # must match training pivot order
+PREDICT_MAX_BATCH = int(os.getenv("PREDICT_MAX_BATCH", "5000"))
+# micro-batching window for concurrent single-row calls (0 disables)
+PREDICT_BATCH_WINDOW_MS = float(os.getenv("PREDICT_BATCH_WINDOW_MS", "2"))
+PREDICT_BATCH_ROWS = int(os.getenv("PREDICT_BATCH_ROWS", "64"))
 
 app = FastAPI(title="Mayo Demo – MLflow Model API", version="1.1.0")
 
@@ -29,6 +35,20 @@ class AdmissionRequest(BaseModel):
     loinc_2345_7: Optional[float] = Field(None, description="Glucose (mg/dL)")
     loinc_718_7:  Optional[float] = Field(None, description="Hemoglobin (g/dL)")
 
+class AdmissionBatchRequest(BaseModel):
+    instances: List[AdmissionRequest] = Field(
+        default_factory=list, description="Up to PREDICT_MAX_BATCH (default 5000) rows"
+    )
+
+def _predict_proba(model, X: pd.DataFrame) -> np.ndarray:
+    """P(admit) for every row of X. sklearn: predict_proba; pyfunc: coerce predict output."""
+    if hasattr(model, "predict_proba"):
+        return np.asarray(model.predict_proba(X)[:, 1], dtype=float)
+    # if it returns probabilities or scores, keep them; else cast to 0/1
+    yhat = np.asarray(model.predict(X), dtype=float).ravel()
+    in_unit = (yhat >= 0.0) & (yhat <= 1.0)
+    return np.where(in_unit, yhat, (yhat >= 0.5).astype(float))
+
 def _load_model() -> Dict[str, Any]:
     """
     Try MLflow registry first; if that fails, fall back to local joblib.
@@ -55,6 +75,13 @@ def _load_model() -> Dict[str, Any]:
 @app.on_event("startup")
 def startup_load():
     app.state.model_bundle = _load_model()
+    app.state.batcher = None
+    if PREDICT_BATCH_WINDOW_MS > 0:
+        model = app.state.model_bundle["model"]
+        app.state.batcher = MicroBatcher(
+            lambda X: _predict_proba(model, pd.DataFrame(X, columns=FEATURE_ORDER)),
+            max_batch=PREDICT_BATCH_ROWS, max_wait_ms=PREDICT_BATCH_WINDOW_MS,
+        )
 
 @app.get("/health")
 def health():
@@ -75,25 +102,19 @@ def model_info():
     return info
 
 @app.post("/predict/admission")
-def predict(inp: AdmissionRequest):
+async def predict(inp: AdmissionRequest):
     try:
         f_glu = float(inp.loinc_2345_7 or 0.0)
         f_hgb = float(inp.loinc_718_7  or 0.0)
-        row = pd.DataFrame([[f_glu, f_hgb]], columns=FEATURE_ORDER)
 
-        model = app.state.model_bundle["model"]
-
-        # Prefer predict_proba (sklearn). For pyfunc, try predict and coerce.
-        if hasattr(model, "predict_proba"):
-            proba = float(model.predict_proba(row)[:, 1][0])
+        batcher = app.state.batcher
+        if batcher is not None:
+            proba = await batcher.submit(np.array([f_glu, f_hgb]))
         else:
-            yhat = model.predict(row)
-            # if returns probabilities or scores, try to coerce; else cast to 0/1
-            yhat = np.asarray(yhat).ravel()
-            if yhat.size and 0.0 <= float(yhat[0]) <= 1.0:
-                proba = float(yhat[0])
-            else:
-                proba = float(yhat[0] >= 0.5)
+            row = pd.DataFrame([[f_glu, f_hgb]], columns=FEATURE_ORDER)
+            # Prefer predict_proba (sklearn). For pyfunc, try predict and coerce.
+            # MLflow/sklearn + pandas: run in a worker thread, not on the event loop
+            proba = float((await asyncio.to_thread(_predict_proba, app.state.model_bundle["model"], row))[0])
 
         label = int(proba >= 0.5)
         return {
@@ -109,3 +130,26 @@ def predict(inp: AdmissionRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Prediction failed: {e}")
 
+@app.post("/predict/admission/batch")
+def predict_batch(inp: AdmissionBatchRequest):
+    """Score up to PREDICT_MAX_BATCH rows with one model call; results keep request order."""
+    n = len(inp.instances)
+    if n > PREDICT_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch of {n} exceeds PREDICT_MAX_BATCH={PREDICT_MAX_BATCH}")
+    try:
+        X = pd.DataFrame(
+            np.array([[float(r.loinc_2345_7 or 0.0), float(r.loinc_718_7 or 0.0)] for r in inp.instances],
+                     dtype=float).reshape(n, len(FEATURE_ORDER)),
+            columns=FEATURE_ORDER,
+        )
+        proba = _predict_proba(app.state.model_bundle["model"], X) if n else np.empty(0)
+        return {
+            "ok": True,
+            "model_source": app.state.model_bundle["source"],
+            "count": n,
+            "results": [{"probability_admit": float(p), "predicted_label": int(p >= 0.5)} for p in proba],
+            "details": {"threshold": 0.5, "feature_order": FEATURE_ORDER},
+        }
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {e}")
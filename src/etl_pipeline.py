@@ -1,21 +1,53 @@
-﻿import pandas as pd
-from py2neo import Graph
+﻿import argparse, json
+from pathlib import Path
+import pandas as pd
 
 REQUIRED = {"patient_id","encounter_id","loinc","lab_value","unit","collected_date"}
+DX_SNAPSHOT = Path("out/kg_dx_snapshot.json")  # {loinc: [dx codes]} from the last online run
+
+def fetch_dx_for_loincs(graph, loincs):
+    """All LOINC -> [dx codes] mappings in one round-trip (LOINCs with no edges map to [])."""
+    q = """
+    UNWIND $loincs AS loinc
+    OPTIONAL MATCH (:Lab {loinc: loinc})-[]->(d:Diagnosis)
+    RETURN loinc, collect(d.code) AS dx
+    """
+    return {r["loinc"]: r["dx"] for r in graph.run(q, loincs=list(loincs)).data()}
+
+def load_dx_snapshot(path=DX_SNAPSHOT):
+    if not Path(path).exists():
+        return {}
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+def save_dx_snapshot(mapping, path=DX_SNAPSHOT):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps(mapping, ensure_ascii=False, sort_keys=True), encoding="utf-8")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--offline", action="store_true",
+                    help=f"enrich from {DX_SNAPSHOT} instead of querying Neo4j")
+    ap.add_argument("--snapshot", type=Path, default=DX_SNAPSHOT)
+    args = ap.parse_args(argv)
 
-def fetch_dx_for_loinc(graph, loinc):
-    q = "MATCH (:Lab {loinc:$loinc})-[]->(d:Diagnosis) RETURN collect(d.code) AS dx"
-    res = graph.run(q, loinc=loinc).data()
-    return res[0]["dx"] if res else []
-
-def main():
     df = pd.read_parquet("out/labs_clean.parquet")
     assert REQUIRED.issubset(df.columns), f"Schema mismatch: {set(df.columns)}"
 
-    graph = Graph("bolt://localhost:7687", auth=("neo4j","testpass"))
-
-    # attach dx codes from KG
-    df["dx_codes"] = df["loinc"].apply(lambda x: fetch_dx_for_loinc(graph, x))
+    # attach dx codes from KG: one lookup per distinct LOINC, joined back with a map
+    loincs = sorted(df["loinc"].dropna().astype(str).unique())
+    if args.offline:
+        mapping = load_dx_snapshot(args.snapshot)
+        unknown = [code for code in loincs if code not in mapping]
+        if unknown:
+            print(f"[WARN] {len(unknown)} LOINCs not in {args.snapshot}; they get no dx codes: {unknown[:10]}")
+    else:
+        from py2neo import Graph
+        graph = Graph("bolt://localhost:7687", auth=("neo4j","testpass"))
+        mapping = {**load_dx_snapshot(args.snapshot), **fetch_dx_for_loincs(graph, loincs)}
+        save_dx_snapshot(mapping, args.snapshot)
+    print(f"Enriched {len(df)} rows from {len(loincs)} distinct LOINCs")
+
+    df["dx_codes"] = [mapping.get(code, []) for code in df["loinc"].astype(str)]
 
     # simple validity check
     df["is_value_valid"] = df["lab_value"].apply(lambda v: bool(pd.notna(v) and v > 0))
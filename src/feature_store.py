@@ -0,0 +1,71 @@
+# src/feature_store.py
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class _Snapshot(NamedTuple):
+    mtime: float
+    columns: List[str]
+    matrix: np.ndarray          # (n_patients, n_columns) float32
+    row_of: Dict[int, int]      # patient_id -> row in matrix
+
+
+class FeatureStore:
+    """
+    patient_id-indexed, float32 copy of the features parquet (data/processed/features.parquet).
+      - loaded once, aligned to `columns` (e.g. the model's feature_list.json; missing -> NaN)
+      - file mtime is re-checked at most every `check_interval` seconds; a changed file
+        is loaded into a new snapshot that replaces the old one in a single assignment,
+        so readers never see a half-loaded table
+      - a row lookup is a dict hit + array slice
+    """
+
+    def __init__(self, path, columns: Optional[List[str]] = None, check_interval: float = 1.0):
+        self.path = Path(path)
+        self.columns = list(columns) if columns is not None else None
+        self.check_interval = check_interval
+        self._snap: Optional[_Snapshot] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, mtime: float) -> _Snapshot:
+        df = pd.read_parquet(self.path)
+        df = df.drop_duplicates("patient_id", keep="last")
+        cols = self.columns if self.columns is not None else [c for c in df.columns if c != "patient_id"]
+        matrix = df.reindex(columns=cols).to_numpy(dtype=np.float32)
+        row_of = {int(pid): i for i, pid in enumerate(df["patient_id"].tolist())}
+        return _Snapshot(mtime, cols, matrix, row_of)
+
+    def snapshot(self) -> _Snapshot:
+        snap, now = self._snap, time.monotonic()
+        if snap is not None and now - self._checked < self.check_interval:
+            return snap
+        with self._lock:
+            self._checked = now
+            mtime = os.stat(self.path).st_mtime
+            if self._snap is None or self._snap.mtime != mtime:
+                self._snap = self._load(mtime)
+            return self._snap
+
+    def get_row(self, patient_id: int) -> Optional[np.ndarray]:
+        snap = self.snapshot()
+        i = snap.row_of.get(int(patient_id))
+        return None if i is None else snap.matrix[i]
+
+    def get_rows(self, patient_ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(matrix aligned to patient_ids, found mask); unknown ids get NaN rows."""
+        snap = self.snapshot()
+        idx = np.array([snap.row_of.get(int(p), -1) for p in patient_ids], dtype=np.int64)
+        found = idx >= 0
+        out = np.full((len(patient_ids), len(snap.columns)), np.nan, dtype=np.float32)
+        out[found] = snap.matrix[idx[found]]
+        return out, found
+
+    def __len__(self):
+        return len(self.snapshot().row_of)
@@ -0,0 +1,278 @@
+# src/fhir_client.py
+import asyncio
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401  optional: httpx needs it for HTTP/2
+    HAS_H2 = True
+except ImportError:
+    HAS_H2 = False
+
+IDEMPOTENT = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+RETRY_STATUS = {429, 502, 503, 504}
+
+
+class FhirUnavailable(Exception):
+    """Remote FHIR server is failing fast (circuit open)."""
+
+    status_code = 503
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker.
+      - closed: calls go through; `threshold` failures in a row open it
+      - open: calls fail immediately for `reset_after` seconds
+      - half-open: one trial call goes through; success closes, failure re-opens
+    A trial that ends without an HTTP outcome (cancelled, unexpected error) counts as a failure,
+    so the slot is always released.
+    """
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0):
+        self.threshold = max(1, threshold)
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def acquire(self) -> Optional[str]:
+        """"closed" or "trial" when the call may go through, None when it is rejected."""
+        state = self.state
+        if state == "closed":
+            return "closed"
+        if state == "half-open" and not self._trial:
+            self._trial = True
+            return "trial"
+        self.rejected += 1
+        return None
+
+    def allow(self) -> bool:
+        return self.acquire() is not None
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def failure(self):
+        self.failures += 1
+        self._trial = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    def status(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures, "rejected": self.rejected}
+
+
+class FhirClient:
+    """
+    Shared keep-alive client for the remote FHIR server (one per process).
+      - pooled connections: `max_connections` total, `max_keepalive` idle kept warm
+      - HTTP/2 when asked for and `h2` is installed
+      - retries with exponential backoff + jitter on connect errors (any method) and on
+        429/502/503/504 or read errors (idempotent methods only); Retry-After is honoured up to
+        `max_backoff`, and no retry starts once `budget` seconds (default: `timeout`) are spent
+      - a CircuitBreaker fails fast with FhirUnavailable while the server is down
+      - `transport` lets tests point it at an in-process app (see tests/fhir_stub.py)
+      - `errors` is every exception a call can raise for an upstream problem (catch it without importing httpx)
+    """
+
+    errors = (FhirUnavailable, httpx.HTTPError, ValueError)
+
+    def __init__(self, base_url: str, timeout: float = 15.0, max_connections: int = 100,
+                 max_keepalive: int = 20, http2: bool = False, retries: int = 3, backoff: float = 0.2,
+                 max_backoff: float = 10.0, budget: Optional[float] = None,
+                 breaker: Optional[CircuitBreaker] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget if budget is not None else timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.http2 = http2 and HAS_H2
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url, timeout=timeout, http2=self.http2, transport=transport,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            headers={"Accept": "application/fhir+json"},
+        )
+        self.requests = 0
+        self.retried = 0
+        self.failed = 0
+
+    @classmethod
+    def from_env(cls, base_url: str, **kw) -> "FhirClient":
+        return cls(
+            base_url,
+            timeout=float(os.getenv("FHIR_TIMEOUT", "15")),
+            max_connections=int(os.getenv("FHIR_MAX_CONNECTIONS", "100")),
+            max_keepalive=int(os.getenv("FHIR_MAX_KEEPALIVE", "20")),
+            http2=os.getenv("FHIR_HTTP2", "0") == "1",
+            retries=int(os.getenv("FHIR_RETRIES", "3")),
+            max_backoff=float(os.getenv("FHIR_MAX_BACKOFF", "10")),
+            breaker=CircuitBreaker(int(os.getenv("FHIR_BREAKER_THRESHOLD", "5")),
+                                   float(os.getenv("FHIR_BREAKER_RESET", "30"))),
+            **kw,
+        )
+
+    def _delay(self, attempt: int, resp: Optional[httpx.Response]) -> float:
+        after = resp.headers.get("Retry-After") if resp is not None else None
+        if after and after.isdigit():
+            return min(float(after), self.max_backoff)
+        return min(self.backoff * (2 ** attempt) * (0.5 + random.random()), self.max_backoff)
+
+    async def request(self, method: str, url: str, budget: Optional[float] = None, **kw) -> httpx.Response:
+        """
+        Send with retry/backoff; raises FhirUnavailable, httpx.HTTPStatusError or httpx.HTTPError.
+        `budget` caps the seconds spent across attempts (default: the client's budget).
+        """
+        method = method.upper()
+        idempotent = method in IDEMPOTENT
+        deadline = time.monotonic() + (budget if budget is not None else self.budget)
+        for attempt in range(self.retries + 1):
+            slot = self.breaker.acquire()
+            if slot is None:
+                raise FhirUnavailable(f"circuit open for {self.base_url}")
+            self.requests += 1
+            resp = None
+            try:
+                resp = await self.client.request(method, url, **kw)
+                retryable = idempotent and resp.status_code in RETRY_STATUS
+                if resp.status_code < 500 and resp.status_code != 429:
+                    self.breaker.success()  # 4xx is the caller's problem, not an outage
+                else:
+                    self.breaker.failure()
+                delay = self._delay(attempt, resp)
+                if not retryable or not self._can_retry(attempt, delay, deadline):
+                    resp.raise_for_status()
+                    return resp
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                self.breaker.failure()  # request never left: safe to retry any method
+                delay = self._delay(attempt, None)
+                if not self._can_retry(attempt, delay, deadline):
+                    self.failed += 1
+                    raise
+            except httpx.TransportError:
+                self.breaker.failure()
+                delay = self._delay(attempt, None)
+                if not idempotent or not self._can_retry(attempt, delay, deadline):
+                    self.failed += 1
+                    raise
+            except httpx.HTTPStatusError:
+                self.failed += 1
+                raise
+            except BaseException:
+                # cancelled (wait_for timeout, prefetch cancel, client gone) or unexpected: a half-open
+                # trial must not keep its slot, or every later call is rejected
+                if slot == "trial":
+                    self.breaker.failure()
+                raise
+            self.retried += 1
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def _can_retry(self, attempt: int, delay: float, deadline: float) -> bool:
+        return attempt < self.retries and time.monotonic() + delay < deadline
+
+    async def get_json(self, url: str, params: Optional[Dict[str, str]] = None,
+                       budget: Optional[float] = None) -> Dict[str, Any]:
+        return (await self.request("GET", url, params=params, budget=budget)).json()
+
+    async def post_json(self, url: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        resp = await self.request("POST", url, json=body, headers={"Content-Type": "application/fhir+json"})
+        return resp.json() if resp.content else {}
+
+    def search(self, url: str, params: Optional[Dict[str, str]] = None, max_rows: Optional[int] = None,
+               time_budget: Optional[float] = None) -> "FhirSearch":
+        return FhirSearch(self, url, params, max_rows, time_budget)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"base_url": self.base_url, "http2": self.http2, "requests": self.requests,
+                "retried": self.retried, "failed": self.failed, "breaker": self.breaker.status()}
+
+
+def next_link(bundle: Dict[str, Any]) -> Optional[str]:
+    for link in bundle.get("link") or []:
+        if link.get("relation") == "next" and link.get("url"):
+            return link["url"]
+    return None
+
+
+class FhirSearch:
+    """
+    Async iterator over the resources of a FHIR search, across every page.
+      - follows Bundle link[rel=next]; the next page is fetched while the caller consumes the current one
+      - stops after `max_rows` resources or `time_budget` seconds; `truncated` then says which
+        ("rows" / "time"), and `pages` / `rows` count what was read
+    """
+
+    def __init__(self, client: FhirClient, url: str, params: Optional[Dict[str, str]] = None,
+                 max_rows: Optional[int] = None, time_budget: Optional[float] = None):
+        self.client = client
+        self.url = url
+        self.params = params
+        self.max_rows = max_rows
+        self.time_budget = time_budget
+        self.pages = 0
+        self.rows = 0
+        self.truncated: Optional[str] = None
+        self.total: Optional[int] = None
+
+    @staticmethod
+    def _left(deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    async def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        deadline = time.monotonic() + self.time_budget if self.time_budget else None
+        pending: Optional[asyncio.Task] = asyncio.ensure_future(
+            self.client.get_json(self.url, params=self.params, budget=self._left(deadline)))
+        try:
+            while pending is not None:
+                try:
+                    if deadline is None:
+                        bundle = await pending
+                    else:
+                        bundle = await asyncio.wait_for(pending, max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    self.truncated = "time"
+                    return
+                self.pages += 1
+                if self.total is None:
+                    self.total = bundle.get("total")
+                entries = bundle.get("entry") or []
+                nxt = next_link(bundle)
+                more = self.max_rows is None or self.rows + len(entries) < self.max_rows
+                # prefetch: the next page is in flight while this one is handed out
+                pending = (asyncio.ensure_future(self.client.get_json(nxt, budget=self._left(deadline)))
+                           if nxt and more else None)
+                for e in entries:
+                    res = e.get("resource")
+                    if res is None:
+                        continue
+                    if self.max_rows is not None and self.rows >= self.max_rows:
+                        self.truncated = "rows"
+                        return
+                    self.rows += 1
+                    yield res
+                if nxt and not more:
+                    self.truncated = "rows"
+                if deadline is not None and pending is not None and time.monotonic() >= deadline:
+                    self.truncated = "time"
+                    return
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
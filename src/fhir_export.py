@@ -1,11 +1,23 @@
-﻿import json
+﻿import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
+import numpy as np
 import pandas as pd
 
+from src.fhir_storage import open_storage, storage_kind
+
+try:
+    import orjson  # optional: several times faster than json.dumps
+except ImportError:
+    orjson = None
+
+# run from the repo root: python -m src.fhir_export [--format ndjson] [--workers 4]
 IN_PATH = Path("out/labs_curated.parquet")
 OUT_DIR = Path("out/fhir")
 INDEX_PATH = OUT_DIR / "index.json"
+CHUNK_ROWS = 50_000
 
 def uom_to_ucum(unit: str):
     # map common lab units to UCUM coding
@@ -18,13 +30,8 @@ def uom_to_ucum(unit: str):
     # fallback
     return {"value_unit": unit_norm or "1", "system":"http://unitsofmeasure.org", "code": unit_norm or "1"}
 
-def to_fhir_observation(row):
-    # Build a stable ID: obs-<patient>-<loinc>-<yyyymmdd>
-    date = pd.to_datetime(row["collected_date"]).date()
-    obs_id = f"obs-{row['patient_id']}-{row['loinc']}-{date.strftime('%Y%m%d')}"
-    ucum = uom_to_ucum(row["unit"])
-
-    return obs_id, {
+def _observation(obs_id, patient_id, loinc, iso_date, value, ucum):
+    return {
         "resourceType": "Observation",
         "id": obs_id,
         "status": "final",
@@ -38,24 +45,108 @@ def to_fhir_observation(row):
         "code": {
             "coding": [{
                 "system": "http://loinc.org",
-                "code": str(row["loinc"]),
+                "code": loinc,
                 "display": "Lab test"
             }],
             "text": "Lab Observation"
         },
         "subject": {
-            "reference": f"Patient/{row['patient_id']}"
+            "reference": f"Patient/{patient_id}"
         },
-        "effectiveDateTime": f"{date.isoformat()}T00:00:00Z",
+        "effectiveDateTime": f"{iso_date}T00:00:00Z",
         "valueQuantity": {
-            "value": float(row["lab_value"]),
+            "value": value,
             "unit": ucum["value_unit"],
             "system": ucum["system"],
             "code": ucum["code"]
         }
     }
 
-def main():
+def to_fhir_observation(row):
+    # Build a stable ID: obs-<patient>-<loinc>-<yyyymmdd>
+    date = pd.to_datetime(row["collected_date"]).date()
+    obs_id = f"obs-{row['patient_id']}-{row['loinc']}-{date.strftime('%Y%m%d')}"
+    return obs_id, _observation(obs_id, row["patient_id"], str(row["loinc"]), date.isoformat(),
+                                float(row["lab_value"]), uom_to_ucum(row["unit"]))
+
+def _dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def prepare_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorized equivalent of to_fhir_observation's per-row work:
+    one to_datetime over the column, string-concatenated ids, UCUM looked up once per distinct unit.
+    """
+    dates = pd.to_datetime(df["collected_date"], errors="coerce")
+    keep = dates.notna().to_numpy()
+    if not keep.all():
+        print(f"Skipping {int((~keep).sum())} rows with unparseable collected_date")
+        df, dates = df[keep], dates[keep]
+
+    pid = df["patient_id"].astype(str)
+    loinc = df["loinc"].astype(str)
+    units = df["unit"].fillna("").astype(str)
+    return pd.DataFrame({
+        "id": "obs-" + pid + "-" + loinc + "-" + dates.dt.strftime("%Y%m%d"),
+        "patient_id": pid,
+        "loinc": loinc,
+        "date": dates.dt.strftime("%Y-%m-%d"),
+        "value": df["lab_value"].astype(float),
+        "unit": units,
+    })
+
+def _encoded_resources(cols: pd.DataFrame):
+    ucum = {u: uom_to_ucum(u) for u in cols["unit"].unique()}
+    for obs_id, pid, loinc, date, value, unit in zip(
+            cols["id"].tolist(), cols["patient_id"].tolist(), cols["loinc"].tolist(),
+            cols["date"].tolist(), cols["value"].tolist(), cols["unit"].tolist()):
+        yield obs_id, _dumps(_observation(obs_id, pid, loinc, date, value, ucum[unit]))
+
+def export_shard(cols: pd.DataFrame, fmt: str, out_dir: Path, shard=None, chunk_rows: int = CHUNK_ROWS):
+    """
+    Write one shard of prepared columns in chunks.
+      - fmt="files":  through the configured storage backend; returns index entries
+      - fmt="ndjson": FHIR Bulk Data style Observation[.<shard>].ndjson; returns []
+    """
+    index = []
+    storage = open_storage(out_dir) if fmt == "files" else None
+    ndjson = None
+    if fmt == "ndjson":
+        name = "Observation.ndjson" if shard is None else f"Observation.{shard:03d}.ndjson"
+        ndjson = open(out_dir / name, "wb")
+    try:
+        for start in range(0, len(cols), chunk_rows):
+            chunk = cols.iloc[start:start + chunk_rows]
+            encoded = list(_encoded_resources(chunk))
+            if ndjson is not None:
+                ndjson.write(b"\n".join(body for _, body in encoded) + b"\n")
+                continue
+            paths = storage.put_many(encoded)
+            index.extend(
+                {"id": i, "loinc": l, "patient_id": p, "date": d, "path": path}
+                for i, l, p, d, path in zip(chunk["id"].tolist(), chunk["loinc"].tolist(),
+                                            chunk["patient_id"].tolist(), chunk["date"].tolist(), paths)
+            )
+    finally:
+        if storage is not None:
+            storage.close()
+        if ndjson is not None:
+            ndjson.close()
+    return index
+
+def _export_shard_args(args):
+    return export_shard(*args)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Export curated labs as FHIR Observations")
+    ap.add_argument("--format", choices=["files", "ndjson"], default="files",
+                    help="files: storage backend (FHIR_STORAGE) + index.json; ndjson: Bulk Data NDJSON")
+    ap.add_argument("--workers", type=int, default=1, help="processes to shard the output across")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = ap.parse_args(argv)
+
     if not IN_PATH.exists():
         raise SystemExit("Missing out/labs_curated.parquet. Run etl_pipeline.py first.")
 
@@ -67,24 +158,35 @@ def main():
     if missing:
         raise SystemExit(f"Missing columns: {missing}")
 
-    index = []
-    for _, row in df.iterrows():
-        obs_id, obs = to_fhir_observation(row)
-        p = OUT_DIR / f"{obs_id}.json"
-        with open(p, "w", encoding="utf-8") as f:
-            json.dump(obs, f, ensure_ascii=False, indent=2)
-        index.append({
-            "id": obs_id,
-            "loinc": str(row["loinc"]),
-            "patient_id": str(row["patient_id"]),
-            "date": str(pd.to_datetime(row["collected_date"]).date()),
-            "path": str(p)
-        })
-
-    with open(INDEX_PATH, "w", encoding="utf-8") as f:
-        json.dump(index, f, ensure_ascii=False, indent=2)
-
-    print(f"Wrote {len(index)} FHIR Observations to {OUT_DIR}")
+    t0 = datetime.now()
+    cols = prepare_columns(df[list(required)])
+
+    workers = max(1, args.workers)
+    if args.format == "files" and storage_kind() == "segments" and workers > 1:
+        # one writer per segment directory
+        print("Segment storage is single-writer; exporting with --workers 1")
+        workers = 1
+
+    if workers == 1:
+        index = export_shard(cols, args.format, OUT_DIR, chunk_rows=args.chunk_rows)
+    else:
+        bounds = np.linspace(0, len(cols), workers + 1).astype(int)
+        jobs = [(cols.iloc[lo:hi], args.format, OUT_DIR, n, args.chunk_rows)
+                for n, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:]))]
+        index = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(_export_shard_args, jobs):
+                index.extend(part)
+
+    secs = (datetime.now() - t0).total_seconds()
+    if args.format == "ndjson":
+        print(f"Wrote {len(cols)} FHIR Observations as NDJSON to {OUT_DIR} in {secs:.1f}s")
+        return
+
+    with open(INDEX_PATH, "wb") as f:
+        f.write(_dumps(index))
+
+    print(f"Wrote {len(index)} FHIR Observations to {OUT_DIR} in {secs:.1f}s")
     print(f"Index: {INDEX_PATH}")
 
 if __name__ == "__main__":
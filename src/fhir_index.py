@@ -0,0 +1,278 @@
+# src/fhir_index.py
+import bisect
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class _DateBucket:
+    """Parallel arrays of (date, id) for one index key, sorted by date then id."""
+
+    __slots__ = ("dates", "ids")
+
+    def __init__(self):
+        self.dates: List[str] = []
+        self.ids: List[str] = []
+
+    def _tie(self, date: str) -> Tuple[int, int]:
+        return bisect.bisect_left(self.dates, date), bisect.bisect_right(self.dates, date)
+
+    def add(self, date: str, obs_id: str):
+        lo, hi = self._tie(date)
+        pos = bisect.bisect_left(self.ids, obs_id, lo, hi)
+        self.dates.insert(pos, date)
+        self.ids.insert(pos, obs_id)
+
+    def remove(self, date: str, obs_id: str):
+        lo, hi = self._tie(date)
+        i = bisect.bisect_left(self.ids, obs_id, lo, hi)
+        if i < hi and self.ids[i] == obs_id:
+            del self.dates[i]
+            del self.ids[i]
+
+    def page(self, after: Optional[Tuple[str, str]] = None, date_from: Optional[str] = None,
+             date_to: Optional[str] = None, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """
+        Up to `limit` (date, id) pairs in [date_from, date_to], strictly after the `after` cursor.
+        Callers hold the index lock.
+        """
+        if after is not None:
+            lo, hi = self._tie(after[0])
+            lo = bisect.bisect_right(self.ids, after[1], lo, hi)
+        else:
+            lo = bisect.bisect_left(self.dates, date_from) if date_from else 0
+        hi = bisect.bisect_right(self.dates, date_to) if date_to else len(self.dates)
+        if limit is not None:
+            hi = min(hi, lo + max(0, limit))
+        return list(zip(self.dates[lo:hi], self.ids[lo:hi]))
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class FhirIndex:
+    """
+    In-memory index over the local FHIR Observation store.
+      - by id:                      id -> index entry
+      - by loinc / patient / both:  key -> date-sorted bucket
+    A query is a dict hit plus a bisect on the bucket's dates, so O(log N + k).
+    Dates are 'YYYY-MM-DD' strings, which sort lexicographically.
+    Writers and query slices share one lock, so a streamed query never sees a bucket shift.
+    """
+
+    slice_size = 1000  # entries resolved per lock hold in iter_query
+
+    def __init__(self):
+        self._by_id: Dict[str, dict] = {}
+        self._by_loinc: Dict[str, _DateBucket] = {}
+        self._by_patient: Dict[str, _DateBucket] = {}
+        self._by_loinc_patient: Dict[Tuple[str, str], _DateBucket] = {}
+        self._all = _DateBucket()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[dict]) -> "FhirIndex":
+        idx = cls()
+        # last entry wins for duplicate ids (same as the old list rewrite)
+        for e in entries:
+            if e.get("id"):
+                idx._by_id[e["id"]] = e
+        # bulk build: group first, sort each bucket once
+        groups: Dict[tuple, List[Tuple[str, str]]] = {}
+        for e in idx._by_id.values():
+            for key in idx._keys(e):
+                groups.setdefault(key, []).append((e.get("date") or "", e["id"]))
+        for key, pairs in groups.items():
+            pairs.sort()
+            bucket = idx._bucket(key)
+            bucket.dates = [d for d, _ in pairs]
+            bucket.ids = [i for _, i in pairs]
+        return idx
+
+    @staticmethod
+    def _keys(e: dict) -> List[tuple]:
+        loinc, pid = str(e.get("loinc")), str(e.get("patient_id"))
+        return [("all",), ("loinc", loinc), ("patient", pid), ("loinc_patient", (loinc, pid))]
+
+    def _bucket(self, key: tuple) -> _DateBucket:
+        if key[0] == "all":
+            return self._all
+        table = {"loinc": self._by_loinc, "patient": self._by_patient,
+                 "loinc_patient": self._by_loinc_patient}[key[0]]
+        bucket = table.get(key[1])
+        if bucket is None:
+            bucket = table[key[1]] = _DateBucket()
+        return bucket
+
+    def upsert(self, entry: dict):
+        """Insert or replace the entry with the same id."""
+        with self._lock:
+            old = self._by_id.get(entry["id"])
+            if old is not None:
+                self.remove(old["id"])
+            self._by_id[entry["id"]] = entry
+            for key in self._keys(entry):
+                self._bucket(key).add(entry.get("date") or "", entry["id"])
+
+    def remove(self, obs_id: str):
+        with self._lock:
+            e = self._by_id.pop(obs_id, None)
+            if e is None:
+                return
+            for key in self._keys(e):
+                self._bucket(key).remove(e.get("date") or "", obs_id)
+
+    def get(self, obs_id: str) -> Optional[dict]:
+        return self._by_id.get(obs_id)
+
+    def _lookup(self, loinc: Optional[str], patient_id: Optional[str]) -> Optional[_DateBucket]:
+        if loinc is not None and patient_id is not None:
+            return self._by_loinc_patient.get((str(loinc), str(patient_id)))
+        if loinc is not None:
+            return self._by_loinc.get(str(loinc))
+        if patient_id is not None:
+            return self._by_patient.get(str(patient_id))
+        return self._all
+
+    def iter_query(self, loinc: Optional[str] = None, patient_id: Optional[str] = None,
+                   date_from: Optional[str] = None, date_to: Optional[str] = None,
+                   limit: Optional[int] = None) -> Iterator[dict]:
+        """
+        Yield matching entries in (date, id) order (date bounds are inclusive).
+        Reads `slice_size` entries per lock hold and resumes from the last (date, id) it yielded,
+        so memory stays O(slice_size) however large the result, and a slow consumer (the NDJSON
+        export) never blocks POSTs for long. Writes made during the iteration show up only ahead
+        of the cursor; an entry re-dated to a later day meanwhile can be yielded again.
+        """
+        cursor: Optional[Tuple[str, str]] = None
+        left = limit
+        while left is None or left > 0:
+            n = self.slice_size if left is None else min(self.slice_size, left)
+            with self._lock:
+                bucket = self._lookup(loinc, patient_id)
+                if bucket is None:
+                    return
+                pairs = bucket.page(cursor, date_from, date_to, n)
+                batch = [self._by_id[i] for _, i in pairs]
+            yield from batch
+            if len(pairs) < n:
+                return
+            cursor = pairs[-1]
+            if left is not None:
+                left -= len(pairs)
+
+    def query(self, limit: Optional[int] = None, **filters) -> List[dict]:
+        return list(self.iter_query(limit=limit, **filters))
+
+    def entries(self) -> List[dict]:
+        with self._lock:
+            return list(self._by_id.values())
+
+    def __len__(self):
+        return len(self._by_id)
+
+
+class FhirIndexLog:
+    """
+    Durable form of a FhirIndex: a compact JSON snapshot (index.json) plus an
+    append-only journal (index.journal.jsonl) with one entry per line.
+      - upsert() appends one line, so a POST costs O(1) I/O regardless of store size
+      - every `compact_every` appends a background thread folds the journal
+        into a fresh snapshot (written to a temp file, then os.replace)
+      - load() = snapshot + replay of the journal; a torn last line is ignored
+    """
+
+    def __init__(self, snapshot_path, compact_every: int = 10_000, fsync: bool = False):
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = self.snapshot_path.with_name(self.snapshot_path.stem + ".journal.jsonl")
+        # journal being folded into the snapshot; replayed on load if a compaction was interrupted
+        self.rotated_path = self.journal_path.with_name(self.journal_path.name + ".compacting")
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.index = FhirIndex()
+        self._lock = threading.Lock()
+        self._journal = None
+        self._pending = 0
+        self._compactor: Optional[threading.Thread] = None
+
+    def load(self) -> FhirIndex:
+        entries: List[dict] = []
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                entries.extend(json.load(f))
+        for path in (self.rotated_path, self.journal_path):
+            entries.extend(self._read_journal(path))
+        self.index = FhirIndex.from_entries(entries)
+        return self.index
+
+    @staticmethod
+    def _read_journal(path: Path) -> Iterator[dict]:
+        if not path.exists():
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # torn write from a crash; later appends start on a fresh line
+                    continue
+
+    def upsert(self, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._journal is None:
+                self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+                if self._journal.tell() > 0 and not self._ends_with_newline():
+                    self._journal.write("\n")
+            self._journal.write(line)
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self.index.upsert(entry)
+            self._pending += 1
+            if self._pending >= self.compact_every and not self._compacting():
+                self._compactor = threading.Thread(target=self.compact, name="fhir-index-compact", daemon=True)
+                self._compactor.start()
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.journal_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _compacting(self) -> bool:
+        return self._compactor is not None and self._compactor.is_alive()
+
+    def compact(self):
+        """Fold the journal into a new snapshot. Safe to call while upserts continue."""
+        with self._lock:
+            if self.rotated_path.exists():
+                # a previous compaction died midway: fold its journal into this one
+                with open(self.rotated_path, "a", encoding="utf-8") as dst:
+                    if self.journal_path.exists():
+                        with open(self.journal_path, "r", encoding="utf-8") as src:
+                            dst.write(src.read())
+                    self.journal_path.unlink(missing_ok=True)
+            elif self.journal_path.exists():
+                os.replace(self.journal_path, self.rotated_path)
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            entries = self.index.entries()
+            self._pending = 0
+
+        tmp = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        self.rotated_path.unlink(missing_ok=True)
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
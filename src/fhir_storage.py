@@ -0,0 +1,164 @@
+# src/fhir_storage.py
+import json
+import mmap
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _encode(resource) -> bytes:
+    """Compact UTF-8 JSON; pre-encoded bytes (e.g. from a faster encoder) pass through."""
+    if isinstance(resource, bytes):
+        return resource
+    return json.dumps(resource, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FileStorage:
+    """
+    One JSON file per resource: <root>/<id>.json (the original layout).
+      - dicts are written indented, as the API always did
+      - pre-encoded bytes (fhir_export's compact JSON) are written as given
+    """
+
+    kind = "files"
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def put(self, obs_id: str, resource: dict) -> str:
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / f"{obs_id}.json"
+        if isinstance(resource, bytes):
+            path.write_bytes(resource)
+            return str(path)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(resource, f, ensure_ascii=False, indent=2)
+        return str(path)
+
+    def put_many(self, items: Iterable[Tuple[str, dict]]) -> List[str]:
+        return [self.put(obs_id, res) for obs_id, res in items]
+
+    def get(self, obs_id: str) -> Optional[bytes]:
+        path = self.root / f"{obs_id}.json"
+        if not path.exists():
+            return None
+        return path.read_bytes()
+
+    def close(self):
+        pass
+
+
+class SegmentStorage:
+    """
+    Resources packed as compact JSON lines into append-only segment files
+    (<root>/segments/seg-00000.ndjson, rolled at `segment_bytes`).
+    An offsets log (offsets.jsonl) maps id -> [segment, offset, length]; it is
+    replayed into a dict on open, and the last write for an id wins.
+    Reads slice a cached mmap of the segment, so GET by id is a single lookup.
+    """
+
+    kind = "segments"
+
+    def __init__(self, root, segment_bytes: int = 256 * 1024 * 1024):
+        self.dir = Path(root) / "segments"
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.offsets_path = self.dir / "offsets.jsonl"
+        self._offsets: Dict[str, Tuple[int, int, int]] = {}
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._lock = threading.Lock()
+        self._load_offsets()
+        segs = sorted(self.dir.glob("seg-*.ndjson"))
+        self._seg_no = int(segs[-1].stem.split("-")[1]) if segs else 0
+        self._seg = open(self._seg_path(self._seg_no), "ab")
+        self._offsets_log = open(self.offsets_path, "a", encoding="utf-8")
+
+    def _seg_path(self, n: int) -> Path:
+        return self.dir / f"seg-{n:05d}.ndjson"
+
+    def _load_offsets(self):
+        if not self.offsets_path.exists():
+            return
+        with open(self.offsets_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    obs_id, seg, off, length = json.loads(line)
+                except ValueError:
+                    continue  # torn line from a crash; the resource bytes are simply orphaned
+                self._offsets[obs_id] = (seg, off, length)
+
+    def _append(self, obs_id: str, resource: dict) -> list:
+        data = _encode(resource) + b"\n"
+        off = self._seg.tell()
+        if off and off + len(data) > self.segment_bytes:
+            self._seg.close()
+            self._seg_no += 1
+            self._seg = open(self._seg_path(self._seg_no), "ab")
+            off = self._seg.tell()
+        self._seg.write(data)
+        rec = [obs_id, self._seg_no, off, len(data) - 1]
+        self._offsets[obs_id] = tuple(rec[1:])
+        return rec
+
+    def _commit(self, recs: List[list]):
+        # resource bytes hit the segment before the offsets that point at them
+        self._seg.flush()
+        self._offsets_log.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in recs))
+        self._offsets_log.flush()
+
+    def put(self, obs_id: str, resource: dict) -> str:
+        return self.put_many([(obs_id, resource)])[0]
+
+    def put_many(self, items: Iterable[Tuple[str, dict]]) -> List[str]:
+        with self._lock:
+            recs = [self._append(obs_id, res) for obs_id, res in items]
+            self._commit(recs)
+        return [f"{self._seg_path(seg)}#{off}" for _, seg, off, _ in recs]
+
+    def _map(self, seg: int, end: int) -> mmap.mmap:
+        m = self._maps.get(seg)
+        if m is None or len(m) < end:
+            # (re)map: the active segment grows after it was first mapped
+            with open(self._seg_path(seg), "rb") as f:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            old = self._maps.get(seg)
+            self._maps[seg] = m
+            if old is not None:
+                old.close()
+        return m
+
+    def get(self, obs_id: str) -> Optional[bytes]:
+        loc = self._offsets.get(obs_id)
+        if loc is None:
+            return None
+        seg, off, length = loc
+        with self._lock:
+            if seg == self._seg_no:
+                self._seg.flush()
+            return self._map(seg, off + length)[off:off + length]
+
+    def __contains__(self, obs_id: str) -> bool:
+        return obs_id in self._offsets
+
+    def close(self):
+        with self._lock:
+            self._seg.close()
+            self._offsets_log.close()
+            for m in self._maps.values():
+                m.close()
+            self._maps.clear()
+
+
+def storage_kind(kind: Optional[str] = None) -> str:
+    return (kind or os.getenv("FHIR_STORAGE", "files")).strip().lower()
+
+
+def open_storage(root, kind: Optional[str] = None):
+    """Pick the Observation storage backend: FHIR_STORAGE=files (default) or segments."""
+    kind = storage_kind(kind)
+    if kind == "files":
+        return FileStorage(root)
+    if kind == "segments":
+        return SegmentStorage(root)
+    raise ValueError(f"Unknown FHIR_STORAGE backend: {kind!r} (expected 'files' or 'segments')")
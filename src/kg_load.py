@@ -1,4 +1,10 @@
 ﻿from py2neo import Graph, Node, Relationship
+from pathlib import Path
+import sys
+
+# repo root on the path, so `python src/kg_load.py` imports scripts/ like the API does
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from scripts.neo4j_common import notify_api_kg_changed
 
 graph = Graph("bolt://localhost:7687", auth=("neo4j","testpass"))
 graph.run("MATCH (n) DETACH DELETE n")  # dev only
@@ -27,3 +33,6 @@ for loinc, icd, rel in links:
     tx.create(Relationship(lab, rel, dx))
 tx.commit()
 print("KG loaded.")
+
+# drop cached /dx_by_loinc answers in a running API (API_BASE_URL=http://localhost:8000 plus CACHE_ADMIN_TOKEN)
+notify_api_kg_changed()
@@ -0,0 +1,74 @@
+# src/lazy.py
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class LazyComponent:
+    """
+    Load-once holder for an expensive app dependency (DB client, model, index, ...).
+      - get() runs `loader` on first use (thread-safe, at most once) and caches the value
+      - aget() is the async form; it loads in a worker thread so the event loop never blocks
+      - a failed load is recorded and retried on the next call
+      - `loader` may return None for "not configured"; that still counts as loaded
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._value: Any = None
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded
+
+    def get(self) -> Any:
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                t0 = time.perf_counter()
+                try:
+                    self._value = self._loader()
+                except Exception as e:
+                    self.error = f"{type(e).__name__}: {e}"
+                    raise
+                self.load_seconds = time.perf_counter() - t0
+                self.error = None
+                self._loaded = True
+        return self._value
+
+    async def aget(self) -> Any:
+        if self._loaded:
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+    def reset(self):
+        """Drop the cached value; the next get() reloads."""
+        with self._lock:
+            self._loaded = False
+            self._value = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self._loaded,
+            "configured": self._loaded and self._value is not None,
+            "load_seconds": None if self.load_seconds is None else round(self.load_seconds, 4),
+            "error": self.error,
+        }
+
+
+async def warm_up(components: Iterable[LazyComponent]):
+    """Load every component concurrently in worker threads; failures stay visible via status()."""
+    async def _one(c: LazyComponent):
+        try:
+            await c.aget()
+        except Exception:
+            pass
+
+    await asyncio.gather(*(_one(c) for c in components))
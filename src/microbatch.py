@@ -0,0 +1,73 @@
+# src/microbatch.py
+import asyncio
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-row scoring requests into one vectorized model call.
+      - submit(row) parks the caller on a future
+      - the pending batch is flushed when it reaches `max_batch` rows or when
+        `max_wait_ms` has passed since its first row, whichever comes first
+      - score_batch(X) gets an (n, n_features) matrix and returns n probabilities
+      - offload=True runs score_batch in the default thread pool (heavy models);
+        False runs it inline on the event loop (microsecond linear fast path)
+    """
+
+    def __init__(self, score_batch: Callable[[np.ndarray], np.ndarray], max_batch: int = 64,
+                 max_wait_ms: float = 2.0, offload: bool = True):
+        self.score_batch = score_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.offload = offload
+        self._pending: List[Tuple[np.ndarray, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.rows = 0
+
+    async def submit(self, x: np.ndarray) -> float:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((x, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.rows += len(batch)
+        X = np.vstack([x for x, _ in batch])
+        futs = [f for _, f in batch]
+        if not self.offload:
+            try:
+                self._resolve(futs, self.score_batch(X), None)
+            except Exception as e:
+                self._resolve(futs, None, e)
+            return
+        job = asyncio.get_running_loop().run_in_executor(None, self.score_batch, X)
+        job.add_done_callback(lambda j: self._resolve(futs, None if j.exception() else j.result(), j.exception()))
+
+    @staticmethod
+    def _resolve(futs, proba, exc):
+        for i, f in enumerate(futs):
+            if f.done():  # caller went away (e.g. client disconnect)
+                continue
+            if exc is not None:
+                f.set_exception(exc)
+            else:
+                f.set_result(float(proba[i]))
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "rows": self.rows,
+                "avg_batch": (self.rows / self.batches) if self.batches else 0.0,
+                "max_batch": self.max_batch, "max_wait_ms": self.max_wait * 1000.0}
@@ -0,0 +1,64 @@
+# src/ttl_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire `ttl` seconds after they were stored.
+    Thread-safe; keeps hit/miss/eviction counters for a stats endpoint.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """(found, value); expired entries count as misses and are dropped."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, item[1]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Optional[Hashable] = None) -> int:
+        """Drop one key, or everything when key is None. Returns how many entries went."""
+        with self._lock:
+            self.invalidations += 1
+            if key is None:
+                n = len(self._data)
+                self._data.clear()
+                return n
+            return 1 if self._data.pop(key, None) is not None else 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data), "maxsize": self.maxsize, "ttl_seconds": self.ttl,
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "evictions": self.evictions, "invalidations": self.invalidations,
+            }
@@ -0,0 +1,89 @@
+# tests/fhir_stub.py
+import asyncio
+import itertools
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def make_app(observations: Optional[List[Dict[str, Any]]] = None, latency_ms: float = 0.0,
+             fail_every: int = 0, fail_status: int = 503, retry_after: Optional[int] = None) -> FastAPI:
+    """
+    Minimal in-memory stand-in for a FHIR server (Observation search/create, batch/transaction Bundles).
+      - mount in-process: FhirClient(base, transport=httpx.ASGITransport(app=make_app()))
+      - or run it: uvicorn tests.fhir_stub:app --port 8090  (then FHIR_BASE_URL=http://localhost:8090)
+      - latency_ms delays every response; fail_every=n answers every n-th request with fail_status
+        (+ Retry-After when given); all four live on app.state, so tests can change them mid-run
+    """
+    stub = FastAPI(title="FHIR stub")
+    stub.state.store = {o["id"]: o for o in (observations or [])}
+    stub.state.calls = 0
+    stub.state.latency_ms = latency_ms
+    stub.state.fail_every = fail_every
+    stub.state.fail_status = fail_status
+    stub.state.retry_after = retry_after
+    ids = itertools.count(len(stub.state.store) + 1)
+
+    @stub.middleware("http")
+    async def faults(request: Request, call_next):
+        st = stub.state
+        st.calls += 1
+        if st.latency_ms:
+            await asyncio.sleep(st.latency_ms / 1000.0)
+        if st.fail_every and st.calls % st.fail_every == 0:
+            headers = {"Retry-After": str(st.retry_after)} if st.retry_after is not None else None
+            return JSONResponse({"resourceType": "OperationOutcome"}, status_code=st.fail_status, headers=headers)
+        return await call_next(request)
+
+    @stub.get("/Observation")
+    def search(request: Request, code: Optional[str] = None, _count: int = 50, _offset: int = 0):
+        hits = [o for o in stub.state.store.values()
+                if code is None or any(f"{c.get('system')}|{c.get('code')}" == code or c.get("code") == code
+                                       for c in (o.get("code") or {}).get("coding", []))]
+        page = hits[_offset:_offset + _count]
+        bundle = {"resourceType": "Bundle", "type": "searchset", "total": len(hits),
+                  "link": [{"relation": "self", "url": str(request.url)}],
+                  "entry": [{"resource": o} for o in page]}
+        if _offset + _count < len(hits):
+            nxt = request.url.include_query_params(_offset=_offset + _count)
+            bundle["link"].append({"relation": "next", "url": str(nxt)})
+        return bundle
+
+    @stub.post("/Observation", status_code=201)
+    async def create(request: Request):
+        obs = await request.json()
+        obs["id"] = obs.get("id") or f"stub-{next(ids)}"
+        stub.state.store[obs["id"]] = obs
+        return obs
+
+    @stub.post("/")
+    async def bundle(request: Request):
+        """batch: every entry stands alone; transaction: any bad entry rejects the whole Bundle."""
+        b = await request.json()
+        if b.get("resourceType") != "Bundle" or b.get("type") not in ("batch", "transaction"):
+            return JSONResponse(_outcome("expected a batch or transaction Bundle"), status_code=400)
+        entries = b.get("entry") or []
+        bad = {i for i, e in enumerate(entries) if (e.get("resource") or {}).get("resourceType") != "Observation"}
+        if b["type"] == "transaction" and bad:
+            return JSONResponse(_outcome(f"entry {min(bad)}: only Observation is supported"), status_code=400)
+        out = []
+        for i, e in enumerate(entries):
+            if i in bad:
+                out.append({"response": {"status": "400 Bad Request",
+                                         "outcome": _outcome("only Observation is supported")}})
+                continue
+            obs = dict(e["resource"])
+            obs["id"] = f"stub-{next(ids)}"
+            stub.state.store[obs["id"]] = obs
+            out.append({"response": {"status": "201 Created", "location": f"Observation/{obs['id']}/_history/1"}})
+        return {"resourceType": "Bundle", "type": f"{b['type']}-response", "entry": out}
+
+    return stub
+
+
+def _outcome(msg: str) -> Dict[str, Any]:
+    return {"resourceType": "OperationOutcome", "issue": [{"severity": "error", "code": "invalid", "diagnostics": msg}]}
+
+
+app = make_app()
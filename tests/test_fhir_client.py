@@ -0,0 +1,135 @@
+# tests/test_fhir_client.py
+# FhirClient against the in-process FHIR stub (tests/fhir_stub.py); run from the repo root: python -m pytest -q
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src.fhir_client import CircuitBreaker, FhirClient, FhirUnavailable
+from fhir_stub import make_app  # tests/ is on sys.path under pytest
+
+
+def _obs(i):
+    return {"resourceType": "Observation", "id": f"o{i}",
+            "code": {"coding": [{"system": "http://loinc.org", "code": "8867-4"}]}, "valueQuantity": {"value": i}}
+
+
+@pytest.fixture
+def stub():
+    return make_app([_obs(i) for i in range(5)])
+
+
+def _client(app, **kw):
+    kw.setdefault("backoff", 0.0)
+    return FhirClient("http://stub", transport=httpx.ASGITransport(app=app), **kw)
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retries_transient_status(stub, status):
+    stub.state.fail_every, stub.state.fail_status = 2, status  # 2nd call fails, 3rd succeeds
+
+    async def go():
+        client = _client(stub)
+        await client.get_json("/Observation")
+        bundle = await client.get_json("/Observation")
+        await client.aclose()
+        return client, bundle
+
+    client, bundle = _run(go())
+    assert bundle["total"] == 5
+    assert client.retried == 1 and client.failed == 0
+
+
+def test_retry_after_is_clamped(stub):
+    stub.state.fail_every, stub.state.retry_after = 1, 3600
+
+    async def go():
+        client = _client(stub, retries=2, max_backoff=0.01)
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.get_json("/Observation")
+        await client.aclose()
+        return client
+
+    t = time.monotonic()
+    client = _run(go())
+    assert time.monotonic() - t < 5
+    assert client.requests == 3
+
+
+def test_no_retry_past_budget(stub):
+    stub.state.fail_every = 1
+
+    async def go():
+        client = _client(stub, retries=5, backoff=0.5)
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.get_json("/Observation", budget=0.1)
+        await client.aclose()
+        return client
+
+    assert _run(go()).requests == 1
+
+
+def test_breaker_opens_half_opens_and_closes(stub):
+    stub.state.fail_every = 1
+
+    async def go():
+        client = _client(stub, retries=0, breaker=CircuitBreaker(threshold=2, reset_after=0.05))
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.get_json("/Observation")
+        assert client.breaker.state == "open"
+        with pytest.raises(FhirUnavailable):
+            await client.get_json("/Observation")
+
+        await asyncio.sleep(0.06)
+        assert client.breaker.state == "half-open"
+        stub.state.fail_every = 0
+        await client.get_json("/Observation")
+        assert client.breaker.state == "closed"
+        await client.aclose()
+
+    _run(go())
+
+
+def test_cancelled_trial_releases_breaker(stub):
+    stub.state.fail_every = 1
+
+    async def go():
+        client = _client(stub, retries=0, breaker=CircuitBreaker(threshold=1, reset_after=0.05))
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.get_json("/Observation")
+        await asyncio.sleep(0.06)
+
+        # the half-open trial is cancelled mid-flight: it counts as a failure, it must not wedge the breaker
+        stub.state.fail_every, stub.state.latency_ms = 0, 500
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.get_json("/Observation"), 0.05)
+        assert client.breaker.state == "open"
+
+        await asyncio.sleep(0.06)
+        stub.state.latency_ms = 0
+        await client.get_json("/Observation")
+        assert client.breaker.state == "closed"
+        await client.aclose()
+
+    _run(go())
+
+
+def test_search_follows_pages(stub):
+    async def go():
+        client = _client(stub)
+        search = client.search("/Observation", {"code": "8867-4", "_count": "2"})
+        ids = [o["id"] async for o in search]
+        capped = client.search("/Observation", {"_count": "2"}, max_rows=3)
+        first = [o["id"] async for o in capped]
+        await client.aclose()
+        return search, ids, capped, first
+
+    search, ids, capped, first = _run(go())
+    assert ids == [f"o{i}" for i in range(5)] and search.pages == 3 and search.total == 5
+    assert first == ["o0", "o1", "o2"] and capped.truncated == "rows"
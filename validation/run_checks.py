@@ -1,7 +1,8 @@
 import pandas as pd
 from great_expectations.dataset import PandasDataset
 
-df = pd.read_csv("data/interim/observations.csv")
+df = pd.read_parquet("data/interim/observations.parquet",
+                     columns=["patient_id", "timestamp", "code", "value", "unit"])
 gdf = PandasDataset(df)
 
 required_cols = ["patient_id", "timestamp", "code", "value", "unit"]